@@ -0,0 +1,98 @@
+# asmcache.py: Кэш результатов ассемблирования с адресацией по содержимому
+
+import hashlib
+import os
+import zlib
+from uvmspec import UVMSpec24
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "uvm_asm")
+DEFAULT_CACHE_SIZE = 256 << 20  # 256 МБ
+
+
+def content_key(*parts):
+    """Ключ объекта кэша: SHA-256 от версии спецификации и содержимого."""
+    digest = hashlib.sha256(UVMSpec24.VERSION.encode())
+    for part in parts:
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def split_blocks(lines, boundary=64, max_lines=4096):
+    """
+    Делит строки исходника на блоки по содержимому: блок заканчивается на
+    строке, CRC32 которой кратна boundary (или по достижении max_lines).
+    Правка строки затрагивает только её блок, а вставка и удаление строк
+    не сдвигают границы остальных блоков.
+    """
+    blocks, current = [], []
+    for line in lines:
+        current.append(line)
+        if zlib.crc32(line) % boundary == 0 or len(current) >= max_lines:
+            blocks.append(current)
+            current = []
+    if current:
+        blocks.append(current)
+    return blocks
+
+
+class AssemblyCache:
+    """
+    Кэш на диске: целые бинарные файлы по хэшу исходника и закодированные
+    блоки строк по хэшу блока. Размер ограничен max_bytes, при превышении
+    удаляются давно не использованные объекты (LRU по времени изменения).
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_CACHE_SIZE):
+        self.directory = directory or os.environ.get("UVM_ASM_CACHE", DEFAULT_CACHE_DIR)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def get(self, key):
+        """Возвращает объект или None; использование обновляет время доступа для LRU."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Сохраняет объект атомарно (через временный файл)."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def evict(self):
+        """Удаляет давно не использованные объекты, пока размер кэша больше max_bytes."""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        return total
@@ -2,13 +2,22 @@
 
 import argparse
 import csv
+import io
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from uvmspec import UVMSpec24
+from asmcache import AssemblyCache, DEFAULT_CACHE_SIZE, content_key, split_blocks
+from optimizer import PeepholeOptimizer
+from uvmo import write_object
 
 
 class Assembler:
-    def __init__(self):
+    def __init__(self, cache=None, optimizer=None):
         self.spec = UVMSpec24()
+        self.cache = cache  # AssemblyCache для assemble_cached (None - без кэша)
+        self.optimizer = optimizer  # PeepholeOptimizer для assemble (None - без оптимизации)
         self.commands = []
         self.mnemonic_to_opcode = {
             "LOAD_CONST": self.spec.OP_LOAD,
@@ -19,82 +28,89 @@ class Assembler:
         # Словарь для сопоставления числовых кодов мнемоникам (для обратного преобразования, если нужно)
         self.opcode_to_mnemonic = {v: k for k, v in self.mnemonic_to_opcode.items()}
 
-    def parse_csv(self, input_file):
-        """Парсинг CSV файла в промежуточное представление, ожидая мнемоники."""
-        self.commands = []
+    def parse_row(self, row, row_num):
+        """Разбор одной строки CSV; для пустых строк и комментариев возвращает None."""
+        # Пропускаем пустые строки и комментарии
+        if not row or row[0].strip().startswith('#'):
+            return None
 
-        with open(input_file, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            for row_num, row in enumerate(reader, 1):
-                # Пропускаем пустые строки и комментарии
-                if not row or row[0].strip().startswith('#'):
-                    continue
-
-                # Очищаем значения
-                values = [v.strip() for v in row]
-
-                if not values:
-                    continue # Защита от строки с только комментарием или пробелами
-
-                # Определяем команду по мнемонике
-                mnemonic = values[0]
-                if mnemonic not in self.mnemonic_to_opcode:
-                    raise ValueError(f"Неизвестная мнемоника в строке {row_num}: {mnemonic}")
-
-                opcode = self.mnemonic_to_opcode[mnemonic]
-
-                # Создаем словарь с полями, включая числовую команду
-                cmd = {"A": opcode, "mnemonic": mnemonic} # Добавляем мнемонику для прозрачности
-
-                # Заполняем остальные поля в зависимости от кода операции
-                # Здесь важна проверка по opcode, так как spec знает о форматах
-                if opcode == self.spec.OP_LOAD:
-                    if len(values) >= 3:
-                        cmd["B"] = int(values[1])  # Адрес регистра
-                        cmd["C"] = int(values[2])  # Константа
-                    else:
-                        raise ValueError(f"Недостаточно аргументов для команды {mnemonic} в строке {row_num}")
-                elif opcode == self.spec.OP_READ:
-                    if len(values) >= 4:
-                        cmd["B"] = int(values[1])  # Смещение
-                        cmd["C"] = int(values[2])  # Адрес регистра (результат)
-                        cmd["D"] = int(values[3])  # Адрес регистра (база)
-                    else:
-                        raise ValueError(f"Недостаточно аргументов для команды {mnemonic} в строке {row_num}")
-                elif opcode == self.spec.OP_WRITE:
-                    if len(values) >= 3:
-                        cmd["B"] = int(values[1])  # Адрес регистра (данные)
-                        cmd["C"] = int(values[2])  # Адрес регистра (адрес)
-                    else:
-                        raise ValueError(f"Недостаточно аргументов для команды {mnemonic} в строке {row_num}")
-                elif opcode == self.spec.OP_SHIFT_RIGHT:
-                    if len(values) >= 5:
-                        cmd["B"] = int(values[1])  # Адрес регистра (значение)
-                        cmd["C"] = int(values[2])  # Адрес регистра (сдвиг)
-                        cmd["D"] = int(values[3])  # Смещение
-                        cmd["E"] = int(values[4])  # Адрес регистра (база)
-                    else:
-                        raise ValueError(f"Недостаточно аргументов для команды {mnemonic} в строке {row_num}")
-                else:
-                    # Эта проверка теперь технически лишняя, так как мы уже проверили мнемонику,
-                    # но пусть будет для безопасности.
-                    raise ValueError(f"Неизвестный код операции в строке {row_num}: {opcode}")
+        # Очищаем значения
+        values = [v.strip() for v in row]
+
+        if not values:
+            return None  # Защита от строки с только комментарием или пробелами
+
+        # Определяем команду по мнемонике
+        mnemonic = values[0]
+        if mnemonic not in self.mnemonic_to_opcode:
+            raise ValueError(f"Неизвестная мнемоника в строке {row_num}: {mnemonic}")
+
+        opcode = self.mnemonic_to_opcode[mnemonic]
 
-                self.commands.append(cmd)
+        # Создаем словарь с полями, включая числовую команду
+        cmd = {"A": opcode, "mnemonic": mnemonic} # Добавляем мнемонику для прозрачности
 
+        # Заполняем остальные поля в зависимости от кода операции
+        # Здесь важна проверка по opcode, так как spec знает о форматах
+        if opcode == self.spec.OP_LOAD:
+            if len(values) >= 3:
+                cmd["B"] = int(values[1])  # Адрес регистра
+                cmd["C"] = int(values[2])  # Константа
+            else:
+                raise ValueError(f"Недостаточно аргументов для команды {mnemonic} в строке {row_num}")
+        elif opcode == self.spec.OP_READ:
+            if len(values) >= 4:
+                cmd["B"] = int(values[1])  # Смещение
+                cmd["C"] = int(values[2])  # Адрес регистра (результат)
+                cmd["D"] = int(values[3])  # Адрес регистра (база)
+            else:
+                raise ValueError(f"Недостаточно аргументов для команды {mnemonic} в строке {row_num}")
+        elif opcode == self.spec.OP_WRITE:
+            if len(values) >= 3:
+                cmd["B"] = int(values[1])  # Адрес регистра (данные)
+                cmd["C"] = int(values[2])  # Адрес регистра (адрес)
+            else:
+                raise ValueError(f"Недостаточно аргументов для команды {mnemonic} в строке {row_num}")
+        elif opcode == self.spec.OP_SHIFT_RIGHT:
+            if len(values) >= 5:
+                cmd["B"] = int(values[1])  # Адрес регистра (значение)
+                cmd["C"] = int(values[2])  # Адрес регистра (сдвиг)
+                cmd["D"] = int(values[3])  # Смещение
+                cmd["E"] = int(values[4])  # Адрес регистра (база)
+            else:
+                raise ValueError(f"Недостаточно аргументов для команды {mnemonic} в строке {row_num}")
+        else:
+            # Эта проверка теперь технически лишняя, так как мы уже проверили мнемонику,
+            # но пусть будет для безопасности.
+            raise ValueError(f"Неизвестный код операции в строке {row_num}: {opcode}")
+
+        return cmd
+
+    def iter_commands(self, input_file):
+        """Построчный разбор CSV: генератор команд промежуточного представления."""
+        # utf-8-sig: метка порядка байт в начале файла пропускается (как во всех режимах)
+        with open(input_file, 'r', encoding='utf-8-sig') as f:
+            for row_num, row in enumerate(csv.reader(f), 1):
+                cmd = self.parse_row(row, row_num)
+                if cmd is not None:
+                    yield cmd
+
+    def parse_csv(self, input_file):
+        """Парсинг CSV файла в промежуточное представление, ожидая мнемоники."""
+        self.commands = list(self.iter_commands(input_file))
         return self.commands
 
     def assemble(self, input_file, output_file=None, test_mode=False):
         """Основная функция ассемблирования"""
         # Парсинг CSV
         commands = self.parse_csv(input_file)
+        if self.optimizer is not None:
+            commands, report = self.optimizer.optimize(commands)
+            self.commands = commands
+            print(report)
 
-        # Генерация бинарного кода
-        binary_data = bytearray()
-        for cmd in commands:
-            # Передаём в encode_command словарь с числовыми полями A, B, C...
-            # Функция encode_command в UVMSpec24 должна использовать числовые значения полей
-            binary_data.extend(self.spec.encode_command(cmd))
+        # Генерация бинарного кода: кодировщики построены по таблице FIELDS
+        binary_data = self.spec.encode_many(commands)
 
         # Запись в файл (если указан)
         if output_file:
@@ -106,11 +122,7 @@ class Assembler:
         if test_mode:
             print("=== Промежуточное представление ===")
             for i, cmd in enumerate(commands):
-                # Убираем служебное поле 'mnemonic' из вывода, если оно было добавлено только для отладки
-                # или оставляем его для наглядности
-                cmd_for_print = {k: v for k, v in cmd.items() if k != 'mnemonic'} # Опционально
-                # print(f"Команда {i}: {cmd}") # <-- Если хотим видеть мнемонику
-                print(f"Команда {i}: {cmd_for_print}") # <-- Если выводим как раньше, без мнемоники
+                self.print_command(i, cmd)
 
             print(f"\n=== Бинарный код ({len(binary_data)} байт) ===")
             for i, byte in enumerate(binary_data):
@@ -118,37 +130,333 @@ class Assembler:
             if len(binary_data) % 8 != 0:
                 print()
 
-            # Сравнение с тестовыми командами
-            print(f"\n=== Проверка тестовых команд ===")
-            for test_name, test_data in self.spec.TEST_COMMANDS.items():
-                print(f"\n{test_name.upper()}:")
-                # Предполагаем, что TEST_COMMANDS теперь содержит числовые коды
-                # и что encode_command ожидает числовые поля
-                encoded = self.spec.encode_command(test_data["fields"])
-                expected = bytes(test_data["hex"])
-                if encoded == expected:
-                    print(f"  ✓ Кодирование корректно")
-                    print(f"  Байты: {', '.join(f'0x{b:02X}' for b in encoded)}")
-                else:
-                    print(f"  ✗ Ошибка кодирования")
-                    print(f"  Ожидалось: {', '.join(f'0x{b:02X}' for b in expected)}")
-                    print(f"  Получено:  {', '.join(f'0x{b:02X}' for b in encoded)}")
+            self.check_test_commands()
 
         print(f"Ассемблировано команд: {len(commands)}")
         print(f"Размер бинарного кода: {len(binary_data)} байт")
 
         return commands, binary_data
 
-def main():
+    def assemble_stream(self, input_file, output_file=None, test_mode=False, chunk_size=1 << 20):
+        """
+        Потоковое ассемблирование: разбор, кодирование и запись идут конвейером
+        генераторов, в памяти одновременно находится не больше chunk_size байт
+        кода. Промежуточное представление печатается только в режиме test_mode.
+        Файл пишется во временный и переименовывается после успешного завершения.
+        """
+        encoders = self.spec.ENCODERS
+        count = size = 0
+        temp_file = output_file + '.tmp' if output_file else None
+        out = open(temp_file, 'wb') if temp_file else None
+        buffer = bytearray()
+        try:
+            if test_mode:
+                print("=== Промежуточное представление ===")
+            for cmd in self.iter_commands(input_file):
+                if test_mode:
+                    self.print_command(count, cmd)
+                buffer += encoders[cmd["A"]](cmd)
+                count += 1
+                if len(buffer) >= chunk_size:
+                    size += len(buffer)
+                    if out:
+                        out.write(buffer)
+                    buffer.clear()
+            size += len(buffer)
+            if out:
+                out.write(buffer)
+        except BaseException:
+            if out:
+                out.close()
+                os.remove(temp_file)
+            raise
+
+        if out:
+            out.close()
+            os.replace(temp_file, output_file)
+            print(f"Бинарный файл сохранен: {output_file}")
+
+        if test_mode:
+            self.check_test_commands()
+
+        print(f"Ассемблировано команд: {count}")
+        print(f"Размер бинарного кода: {size} байт")
+
+        return count, size
+
+    def assemble_cached(self, input_file, output_file=None):
+        """
+        Ассемблирование через кэш: неизменённый исходник возвращается из кэша
+        целиком, у изменённого заново кодируются только блоки с правками
+        (см. asmcache.split_blocks), остальные берутся из кэша.
+        """
+        cache = self.cache if self.cache is not None else AssemblyCache()
+        with open(input_file, 'rb') as f:
+            source = f.read()
+
+        file_key = content_key(b"file", source)
+        binary_data = cache.get(file_key)
+        reused = total = 0
+        if binary_data is None:
+            encoders = self.spec.ENCODERS
+            parts = []
+            row_num = 1
+            for block in split_blocks(source.splitlines(keepends=True)):
+                block_key = content_key(b"block", *block)
+                encoded = cache.get(block_key)
+                total += 1
+                if encoded is None:
+                    text = b"".join(block).decode('utf-8')
+                    if row_num == 1:
+                        text = _strip_bom(text)
+                    chunks = []
+                    for i, row in enumerate(csv.reader(io.StringIO(text, newline='')), row_num):
+                        cmd = self.parse_row(row, i)
+                        if cmd is not None:
+                            chunks.append(encoders[cmd["A"]](cmd))
+                    encoded = b"".join(chunks)
+                    cache.put(block_key, encoded)
+                else:
+                    reused += 1
+                parts.append(encoded)
+                row_num += len(block)
+            binary_data = b"".join(parts)
+            cache.put(file_key, binary_data)
+        # Вытеснение после каждого запуска: get обновляет время доступа,
+        # поэтому и при попадании порядок вытеснения должен пересчитываться
+        cache.evict()
+
+        if output_file:
+            with open(output_file, 'wb') as f:
+                f.write(binary_data)
+            print(f"Бинарный файл сохранен: {output_file}")
+        if total:
+            print(f"Кэш: повторно использовано блоков {reused} из {total}")
+        else:
+            print("Кэш: исходник не изменился, бинарный код взят из кэша")
+        print(f"Ассемблировано команд: {_count_commands(binary_data)}")
+        print(f"Размер бинарного кода: {len(binary_data)} байт")
+        return binary_data
+
+    def assemble_parallel(self, input_file, output_file, jobs, chunk_bytes=16 << 20):
+        """
+        Параллельное ассемблирование в пуле процессов. Размер каждой команды
+        определяется мнемоникой (CMD_SIZES), поэтому смещения в выходном файле
+        вычисляются до кодирования: вход делится на диапазоны строк, первый
+        проход считает строки и размер кода диапазонов, второй - кодирует
+        диапазоны и записывает их в файл по готовым смещениям. Номера строк
+        в сообщениях об ошибках - глобальные. Строки CSV не должны содержать
+        переводов строк внутри кавычек.
+        """
+        ranges = self._split_lines(input_file, chunk_bytes, jobs)
+        temp_file = output_file + '.tmp'
+        try:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                sizes = list(pool.map(_measure_range, [input_file] * len(ranges), ranges))
+
+                # Начальные номера строк и смещения в выходном файле
+                tasks = []
+                first_row, offset = 1, 0
+                for (start, end), (lines, size) in zip(ranges, sizes):
+                    tasks.append((input_file, start, end, first_row, temp_file, offset, size))
+                    first_row += lines
+                    offset += size
+                with open(temp_file, 'wb') as f:
+                    f.truncate(offset)
+
+                count = sum(pool.map(_encode_range, *zip(*tasks))) if tasks else 0
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+
+        os.replace(temp_file, output_file)
+        print(f"Бинарный файл сохранен: {output_file}")
+        print(f"Ассемблировано команд: {count}")
+        print(f"Размер бинарного кода: {offset} байт")
+        return count, offset
+
+    @staticmethod
+    def _split_lines(input_file, chunk_bytes, jobs):
+        """Делит файл на диапазоны байт, выровненные по началу строк."""
+        total = os.path.getsize(input_file)
+        step = max(1, min(chunk_bytes, -(-total // jobs)))
+        ranges = []
+        with open(input_file, 'rb') as f:
+            start = 0
+            while start < total:
+                f.seek(min(start + step, total))
+                f.readline()  # Дочитываем до конца строки
+                end = min(f.tell(), total)
+                ranges.append((start, end))
+                start = end
+        return ranges
+
+    def convert_to_object(self, output_file, operands=True):
+        """
+        Преобразует записанный бинарный файл в объектный формат uvmo (см. uvmo.py):
+        заголовок с версией спецификации и контрольной суммой, индекс смещений
+        команд и (если operands) предекодированные операнды.
+        """
+        temp_file = output_file + '.tmp'
+        with open(output_file, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            code = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+            try:
+                count = write_object(temp_file, code, operands)
+            finally:
+                if size:
+                    code.close()
+        os.replace(temp_file, output_file)
+        print(f"Объектный файл сохранен: {output_file} (команд {count})")
+
+    def print_command(self, index, cmd):
+        """Печать команды промежуточного представления (без служебного поля 'mnemonic')."""
+        cmd_for_print = {k: v for k, v in cmd.items() if k != 'mnemonic'}
+        print(f"Команда {index}: {cmd_for_print}")
+
+    def check_test_commands(self):
+        """Сравнение кодирования с тестовыми командами спецификации."""
+        print(f"\n=== Проверка тестовых команд ===")
+        for test_name, test_data in self.spec.TEST_COMMANDS.items():
+            print(f"\n{test_name.upper()}:")
+            encoded = self.spec.encode_command(test_data["fields"])
+            expected = bytes(test_data["hex"])
+            # Биты вне полей FIELDS кодировщик не заполняет
+            difference = int.from_bytes(encoded, 'little') ^ int.from_bytes(expected, 'little')
+            if encoded == expected:
+                print(f"  ✓ Кодирование корректно")
+                print(f"  Байты: {', '.join(f'0x{b:02X}' for b in encoded)}")
+            elif len(encoded) == len(expected) and not difference & self.spec.field_mask(test_data["fields"]["A"]):
+                print(f"  ✓ Кодирование корректно (отличие только в битах вне полей команды)")
+                print(f"  Ожидалось: {', '.join(f'0x{b:02X}' for b in expected)}")
+                print(f"  Получено:  {', '.join(f'0x{b:02X}' for b in encoded)}")
+            else:
+                print(f"  ✗ Ошибка кодирования")
+                print(f"  Ожидалось: {', '.join(f'0x{b:02X}' for b in expected)}")
+                print(f"  Получено:  {', '.join(f'0x{b:02X}' for b in encoded)}")
+
+def _count_commands(code):
+    """Число команд в коде, собранном ассемблером (проход по размерам команд)."""
+    sizes = UVMSpec24.CMD_SIZES
+    count = offset = 0
+    end = len(code)
+    while offset < end:
+        offset += sizes[code[offset]]
+        count += 1
+    return count
+
+
+def _strip_bom(text):
+    """Убирает одну метку порядка байт в начале файла (как кодировка utf-8-sig)."""
+    return text[1:] if text.startswith('\ufeff') else text
+
+
+def _read_range(input_file, start, end):
+    with open(input_file, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+def _row_size(row):
+    """
+    Размер кода строки CSV по мнемонике - так же, как её определяет parse_row;
+    0 для пустых строк, комментариев и неизвестных мнемоник (ошибку сообщит второй проход).
+    """
+    if not row or row[0].strip().startswith('#'):
+        return 0
+    opcode = UVMSpec24.MNEMONIC_TO_OPCODE.get(row[0].strip())
+    return UVMSpec24.CMD_SIZES[opcode] if opcode is not None else 0
+
+
+def _measure_range(input_file, byte_range):
+    """
+    Первый проход: число строк и размер кода диапазона. Строки разбираются
+    тем же csv.reader, что и при кодировании, с той же обработкой метки
+    порядка байт, поэтому размеры совпадают со вторым проходом.
+    """
+    data = _read_range(input_file, *byte_range)
+    text = data.decode('utf-8')
+    if byte_range[0] == 0:
+        text = _strip_bom(text)
+    size = sum(_row_size(row) for row in csv.reader(io.StringIO(text, newline='')))
+    lines = data.count(b'\n') + (1 if data and not data.endswith(b'\n') else 0)
+    return lines, size
+
+
+def _encode_range(input_file, start, end, first_row, output_file, offset, size):
+    """
+    Второй проход: разбор и кодирование диапазона, запись по смещению.
+    Размер кода должен совпасть с вычисленным на первом проходе (size),
+    иначе диапазоны в файле наложились бы друг на друга.
+    """
+    assembler = Assembler()
+    text = _read_range(input_file, start, end).decode('utf-8')
+    if first_row == 1:
+        text = _strip_bom(text)
+    encoders = assembler.spec.ENCODERS
+    chunks = []
+    for row_num, row in enumerate(csv.reader(io.StringIO(text, newline='')), first_row):
+        cmd = assembler.parse_row(row, row_num)
+        if cmd is not None:
+            chunks.append(encoders[cmd["A"]](cmd))
+    code = b"".join(chunks)
+    if len(code) != size:
+        raise ValueError(f"Размер кода строк начиная с {first_row} ({len(code)} байт) не совпадает "
+                         f"с вычисленным при разметке ({size} байт)")
+    with open(output_file, 'r+b') as f:
+        f.seek(offset)
+        f.write(code)
+    return len(chunks)
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Ассемблер УВМ (вариант 24) - Использует мнемоники')
     parser.add_argument('--input', required=True, help='Входной CSV файл с мнемониками')
     parser.add_argument('--output', help='Выходной бинарный файл')
+    parser.add_argument('--format', choices=('bin', 'uvmo'), default='bin',
+                        help='Формат вывода: bin - сырой код, uvmo - объектный файл с индексом команд')
+    parser.add_argument('--no-operands', action='store_true',
+                        help='Не записывать в объектный файл секцию предекодированных операндов')
     parser.add_argument('--test', action='store_true', help='Режим тестирования')
+    parser.add_argument('--stream', action='store_true',
+                        help='Потоковый режим для больших файлов: память не зависит от размера входа')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Число процессов для параллельного ассемблирования (требует --output)')
+    parser.add_argument('-O', '--optimize', action='store_true',
+                        help='Удалить избыточные LOAD_CONST и мёртвые записи в память')
+    parser.add_argument('--opt-memory-size', type=int, default=65536,
+                        help='Размер памяти, для которого оптимизация сохраняет поведение')
+    parser.add_argument('--no-cache', action='store_true', help='Не использовать кэш ассемблирования')
+    parser.add_argument('--cache-dir', help='Каталог кэша (по умолчанию $UVM_ASM_CACHE или ~/.cache/uvm_asm)')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                        help='Предельный размер кэша в байтах')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.format == 'uvmo' and not args.output:
+        parser.error("--format uvmo требует --output")
 
     assembler = Assembler()
-    assembler.assemble(args.input, args.output, args.test)
+    if args.optimize:
+        # Оптимизация работает над всей программой - без кэша, потокового и параллельного режимов
+        if args.stream or args.jobs > 1:
+            parser.error("-O несовместим с --stream и --jobs")
+        assembler.optimizer = PeepholeOptimizer(args.opt_memory_size)
+        assembler.assemble(args.input, args.output, args.test)
+    elif args.jobs > 1:
+        if not args.output or args.test:
+            parser.error("--jobs требует --output и несовместим с --test")
+        assembler.assemble_parallel(args.input, args.output, args.jobs)
+    elif args.stream:
+        assembler.assemble_stream(args.input, args.output, args.test)
+    elif args.test or args.no_cache:
+        # Режиму тестирования нужно промежуточное представление - без кэша
+        assembler.assemble(args.input, args.output, args.test)
+    else:
+        assembler.cache = AssemblyCache(args.cache_dir, args.cache_size)
+        assembler.assemble_cached(args.input, args.output)
+    if args.format == 'uvmo':
+        assembler.convert_to_object(args.output, operands=not args.no_operands)
 
 
 if __name__ == "__main__":
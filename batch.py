@@ -0,0 +1,162 @@
+# batch.py: Пакетное исполнение одной программы УВМ на многих образах памяти
+
+import argparse
+import sys
+import numpy as np
+from interpreter import Interpreter
+from memdump import load_dump
+from uvmspec import UVMSpec24
+
+
+class BatchInterpreter:
+    """
+    Исполнение одной программы в N потоках одновременно. В ISA нет ветвлений,
+    поэтому все потоки проходят одну и ту же последовательность команд, и каждая
+    команда выполняется одной векторной операцией NumPy над всеми потоками.
+    Регистры хранятся массивом (N, 8), память - массивом (N, M). Поток, в котором
+    произошёл выход за границы памяти, останавливается (маска активных потоков),
+    остальные продолжают исполнение. Семантика совпадает с Interpreter
+    с памятью list (значения не усекаются до 32 бит).
+    """
+
+    def __init__(self, images):
+        self.memory = np.array(images, dtype=np.int64, ndmin=2)
+        lanes = self.memory.shape[0]
+        self.registers = np.zeros((lanes, 8), dtype=np.int64)
+        self.active = np.ones(lanes, dtype=bool)
+        self.halted_at = np.full(lanes, -1, dtype=np.int64)  # Индекс команды, на которой поток остановлен
+        self._lanes = np.arange(lanes)
+        self.program = Interpreter(memory_size=0)  # Используется для загрузки и предекодирования
+
+    @property
+    def lane_count(self):
+        return self.memory.shape[0]
+
+    def load_program(self, binary_file_path):
+        """Загружает и предекодирует программу."""
+        self.program.load_program(binary_file_path)
+
+    def _halt(self, lanes, ok, kind, cmd):
+        """Останавливает потоки lanes[~ok] на команде cmd."""
+        faulted = lanes[~ok]
+        self.active[faulted] = False
+        self.halted_at[faulted] = cmd.index
+        self._lanes = np.flatnonzero(self.active)
+        print(f"  ОШИБКА: Выход за границы памяти при {kind} (PC={cmd.pc}) в потоках: {len(faulted)}",
+              file=sys.stderr)
+
+    def execute(self, cmd):
+        """Выполняет одну предекодированную команду во всех активных потоках."""
+        lanes = self._lanes
+        regs, memory = self.registers, self.memory
+        size = memory.shape[1]
+
+        if cmd.opcode == UVMSpec24.OP_LOAD:
+            regs[lanes, cmd.b] = cmd.c
+
+        elif cmd.opcode == UVMSpec24.OP_READ:
+            addresses = regs[lanes, cmd.d] + cmd.b
+            ok = (addresses >= 0) & (addresses < size)
+            if not ok.all():
+                self._halt(lanes, ok, "READ", cmd)
+                lanes, addresses = lanes[ok], addresses[ok]
+            regs[lanes, cmd.c] = memory[lanes, addresses]
+
+        elif cmd.opcode == UVMSpec24.OP_WRITE:
+            addresses = regs[lanes, cmd.c]
+            ok = (addresses >= 0) & (addresses < size)
+            if not ok.all():
+                self._halt(lanes, ok, "WRITE", cmd)
+                lanes, addresses = lanes[ok], addresses[ok]
+            memory[lanes, addresses] = regs[lanes, cmd.b]
+
+        elif cmd.opcode == UVMSpec24.OP_SHIFT_RIGHT:
+            if cmd.c >= regs.shape[1]:
+                raise IndexError("list index out of range")
+            amounts = regs[lanes, cmd.c] + cmd.d
+            negative = amounts < 0
+            if negative.any():
+                print(f"  ПРЕДУПРЕЖДЕНИЕ: Отрицательный сдвиг (PC={cmd.pc}) в потоках: {int(negative.sum())}, "
+                      f"устанавливаем 0", file=sys.stderr)
+            values = np.where((amounts >= 32) | negative, 0,
+                              (regs[lanes, cmd.b] & 0xFFFFFFFF) >> np.clip(amounts, 0, 31))
+            addresses = regs[lanes, cmd.e]
+            ok = (addresses >= 0) & (addresses < size)
+            if not ok.all():
+                self._halt(lanes, ok, "SHIFT_RIGHT", cmd)
+                lanes, addresses, values = lanes[ok], addresses[ok], values[ok]
+            memory[lanes, addresses] = values
+
+    def run(self, max_steps=10000):
+        """
+        Выполняет программу во всех потоках. Как и Interpreter.run, исполняет
+        не больше max_steps + 1 команд. Возвращает число выполненных команд.
+        """
+        decoded = self.program.decoded
+        limit = min(len(decoded), max_steps + 1)
+        executed = 0
+        for cmd in decoded[:limit]:
+            if not len(self._lanes):
+                break
+            self.execute(cmd)
+            executed += 1
+        if executed == len(decoded) and self.program.decode_error and len(self._lanes):
+            pc = decoded[-1].pc + decoded[-1].size if decoded else 0
+            print(f"Ошибка декодирования команды на PC={pc}: {self.program.decode_error}", file=sys.stderr)
+            self.halted_at[self._lanes] = executed
+            self.active[:] = False
+            self._lanes = self._lanes[:0]
+        if executed == limit < len(decoded):
+            print(f"Достигнут лимит шагов ({max_steps}), возможно зацикливание.", file=sys.stderr)
+        print(f"Выполнено команд: {executed}, потоков: {self.lane_count}, "
+              f"остановлено с ошибкой: {int((self.halted_at >= 0).sum())}", file=sys.stderr)
+        return executed
+
+
+def load_images(paths, memory_size):
+    """Собирает образы памяти из дампов (любого формата memdump) в массив (N, memory_size)."""
+    images = np.zeros((len(paths), memory_size), dtype=np.int64)
+    for lane, path in enumerate(paths):
+        with load_dump(path) as dump:
+            end = min(dump.end, memory_size)
+            if end > dump.start:
+                images[lane, dump.start:end] = dump.values()[:end - dump.start]
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Пакетный интерпретатор УВМ: одна программа на многих образах памяти')
+    parser.add_argument('--input', required=True, help='Входной бинарный файл')
+    parser.add_argument('--output', required=True, help='Выходной файл .npy с массивом памяти (N, M)')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--images', nargs='+', help='Начальные образы памяти (дампы json, raw или sparse)')
+    source.add_argument('--images-npy', help='Начальные образы памяти: файл .npy с массивом (N, M)')
+    source.add_argument('--lanes', type=int, help='Число потоков с нулевой начальной памятью')
+    parser.add_argument('--memory-size', type=int, default=65536, help='Размер памяти потока в словах')
+
+    args = parser.parse_args()
+
+    if args.images:
+        images = load_images(args.images, args.memory_size)
+    elif args.images_npy:
+        images = np.load(args.images_npy)
+    else:
+        images = np.zeros((args.lanes, args.memory_size), dtype=np.int64)
+
+    batch = BatchInterpreter(images)
+    try:
+        batch.load_program(args.input)
+        batch.run()
+    except FileNotFoundError:
+        print(f"Ошибка: Файл {args.input} не найден.", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"Ошибка интерпретации: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    np.save(args.output, batch.memory)
+    print(f"Память {batch.lane_count} потоков сохранена в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# bench: Набор тестов производительности УВМ
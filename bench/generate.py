@@ -0,0 +1,101 @@
+# bench/generate.py: Генератор синтетических программ УВМ (CSV с мнемониками)
+
+import argparse
+import random
+from uvmspec import UVMSpec24
+
+PATTERNS = ("sequential", "strided", "random")
+
+# Состав команд по умолчанию: веса мнемоник
+DEFAULT_MIX = {"LOAD_CONST": 4, "READ_MEM": 2, "WRITE_MEM": 2, "SHIFT_RIGHT": 2}
+
+# Адреса ограничены 13-битной знаковой константой LOAD_CONST и смещением READ_MEM
+ADDRESS_SPAN = 4096
+ADDRESS_REG = 0  # Регистр адреса для WRITE_MEM и SHIFT_RIGHT
+ZERO_REG = 7  # Регистр, который программа не изменяет (всегда 0)
+DATA_REGS = range(1, 7)
+
+
+def parse_mix(text):
+    """Разбор состава вида "LOAD_CONST=4,READ_MEM=2" в словарь весов."""
+    mix = {}
+    for part in text.split(","):
+        mnemonic, _, weight = part.partition("=")
+        mnemonic = mnemonic.strip()
+        if mnemonic not in UVMSpec24.MNEMONIC_TO_OPCODE:
+            raise ValueError(f"Неизвестная мнемоника: {mnemonic}")
+        mix[mnemonic] = float(weight) if weight else 1.0
+    return mix
+
+
+class AddressStream:
+    """Последовательность адресов памяти по шаблону доступа."""
+
+    def __init__(self, pattern, stride, rng, span=ADDRESS_SPAN):
+        if pattern not in PATTERNS:
+            raise ValueError(f"Неизвестный шаблон доступа: {pattern}")
+        self.pattern = pattern
+        self.stride = stride if pattern == "strided" else 1
+        self.rng = rng
+        self.span = span
+        self.position = 0
+
+    def next(self):
+        if self.pattern == "random":
+            return self.rng.randrange(self.span)
+        address = self.position % self.span
+        self.position += self.stride
+        return address
+
+
+def generate_program(size, mix=None, pattern="sequential", stride=16, seed=0):
+    """
+    Возвращает список строк CSV из не менее чем size команд. Программа
+    не выходит за границы памяти и не использует отрицательных сдвигов,
+    поэтому исполняется целиком. Адрес для WRITE_MEM и SHIFT_RIGHT
+    загружается в регистр R0 отдельной командой LOAD_CONST.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    mnemonics, weights = list(mix), list(mix.values())
+    addresses = AddressStream(pattern, stride, rng)
+    lines = []
+    while len(lines) < size:
+        mnemonic = rng.choices(mnemonics, weights)[0]
+        if mnemonic == "LOAD_CONST":
+            lines.append(f"LOAD_CONST,{rng.choice(DATA_REGS)},{rng.randrange(-4096, 4096)}")
+        elif mnemonic == "READ_MEM":
+            lines.append(f"READ_MEM,{addresses.next()},{rng.choice(DATA_REGS)},{ZERO_REG}")
+        elif mnemonic == "WRITE_MEM":
+            lines.append(f"LOAD_CONST,{ADDRESS_REG},{addresses.next()}")
+            lines.append(f"WRITE_MEM,{rng.choice(DATA_REGS)},{ADDRESS_REG}")
+        else:
+            lines.append(f"LOAD_CONST,{ADDRESS_REG},{addresses.next()}")
+            lines.append(f"SHIFT_RIGHT,{rng.choice(DATA_REGS)},{ZERO_REG},{rng.randrange(32)},{ADDRESS_REG}")
+    return lines
+
+
+def write_program(path, lines):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("".join(line + "\n" for line in lines))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Генератор синтетических программ УВМ')
+    parser.add_argument('--output', required=True, help='Выходной CSV файл')
+    parser.add_argument('--size', type=int, default=10000, help='Число команд')
+    parser.add_argument('--mix', help='Веса мнемоник, например "LOAD_CONST=4,READ_MEM=2,WRITE_MEM=2,SHIFT_RIGHT=2"')
+    parser.add_argument('--pattern', choices=PATTERNS, default='sequential', help='Шаблон доступа к памяти')
+    parser.add_argument('--stride', type=int, default=16, help='Шаг для шаблона strided')
+    parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора случайных чисел')
+
+    args = parser.parse_args(argv)
+
+    lines = generate_program(args.size, parse_mix(args.mix) if args.mix else None,
+                             args.pattern, args.stride, args.seed)
+    write_program(args.output, lines)
+    print(f"Сгенерировано команд: {len(lines)} ({args.output})")
+
+
+if __name__ == "__main__":
+    main()
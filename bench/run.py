@@ -0,0 +1,202 @@
+# bench/run.py: Замеры производительности ассемблера, интерпретатора и дампов памяти
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import engines
+from assembler import Assembler
+from interpreter import ENGINES, Interpreter
+from memdump import DUMP_FORMATS
+from uvmspec import UVMSpec24
+from bench.generate import PATTERNS, generate_program, parse_mix, write_program
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+MIN_SAMPLE_SECONDS = 0.05  # Короткие операции повторяются в замере, пока не наберётся это время
+
+
+def best_time(function, repeat):
+    """
+    Лучшее из repeat средних времён одного вызова function (каждый замер длится
+    не меньше MIN_SAMPLE_SECONDS) и результат последнего вызова.
+    """
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        calls, elapsed = 0, 0.0
+        while elapsed < MIN_SAMPLE_SECONDS:
+            start = time.perf_counter()
+            result = function()
+            elapsed += time.perf_counter() - start
+            calls += 1
+        best = min(best, elapsed / calls)
+    return best, result
+
+
+def bench_assembler(csv_path, repeat):
+    assembler = Assembler()
+
+    def assemble():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return assembler.assemble(csv_path)
+
+    seconds, (commands, binary_data) = best_time(assemble, repeat)
+    return {"lines": len(commands), "seconds": seconds, "lines_per_sec": len(commands) / seconds}, binary_data
+
+
+def bench_interpreter(binary_data, engine, memory, repeat):
+    """
+    Скорость исполнения; предекодирование и компиляция замеряются отдельно:
+    load_seconds - с пустым кэшем скомпилированных программ (холодная загрузка),
+    load_warm_seconds - с программой в кэше (повторная загрузка). Между запусками сбрасывается только PC: ветвлений нет,
+    и сгенерированные программы не выходят за границы памяти, поэтому каждый
+    запуск выполняет ту же последовательность команд.
+    """
+    interp = Interpreter(engine=engine, memory=memory, max_steps=len(binary_data))
+
+    def cold_load():
+        engines._COMPILED_CACHE.clear()
+        interp.load_program_data(binary_data)
+
+    def run():
+        interp.pc = 0
+        interp.run()
+
+    with contextlib.redirect_stderr(io.StringIO()):
+        load_seconds, _ = best_time(cold_load, repeat)
+        load_warm_seconds, _ = best_time(lambda: interp.load_program_data(binary_data), repeat)
+        run_seconds, _ = best_time(run, repeat)
+    executed = interp.pc_index()
+    return {"instructions": executed, "load_seconds": load_seconds, "load_warm_seconds": load_warm_seconds,
+            "seconds": run_seconds, "instructions_per_sec": executed / run_seconds}, interp
+
+
+def bench_dumps(interp, repeat, directory):
+    results = {}
+    for fmt in DUMP_FORMATS:
+        path = os.path.join(directory, f"dump.{fmt}")
+
+        def dump():
+            with contextlib.redirect_stdout(io.StringIO()):
+                interp.dump_memory(path, fmt=fmt)
+
+        seconds, _ = best_time(dump, repeat)
+        results[fmt] = {"seconds": seconds, "bytes": os.path.getsize(path)}
+    return results
+
+
+def peak_rss_kb():
+    """Пиковый размер резидентной памяти процесса в КБ."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # macOS сообщает в байтах
+
+
+def run_suite(size, patterns=PATTERNS, mix=None, stride=16, seed=0, engines=None, memory="list", repeat=3):
+    """Полный набор замеров; результат - словарь, сериализуемый в JSON."""
+    engines = engines or sorted(ENGINES)
+    results = {
+        "spec_version": UVMSpec24.VERSION,
+        "python": platform.python_version(),
+        "params": {"size": size, "mix": mix, "stride": stride, "seed": seed, "memory": memory, "repeat": repeat},
+        "patterns": {},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for pattern in patterns:
+            csv_path = os.path.join(directory, f"{pattern}.csv")
+            write_program(csv_path, generate_program(size, mix, pattern, stride, seed))
+            assembler_result, binary_data = bench_assembler(csv_path, repeat)
+            case = {"assembler": assembler_result, "interpreter": {}}
+            for engine in engines:
+                case["interpreter"][engine], interp = bench_interpreter(binary_data, engine, memory, repeat)
+            case["dump"] = bench_dumps(interp, repeat, directory)
+            results["patterns"][pattern] = case
+    results["peak_rss_kb"] = peak_rss_kb()
+    return results
+
+
+def flatten(results, prefix=""):
+    """Метрики для сравнения: "patterns.random.interpreter.compile.instructions_per_sec" -> значение."""
+    metrics = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(flatten(value, name + "."))
+        elif key.endswith("_per_sec") or key.endswith("seconds") or key == "peak_rss_kb":
+            metrics[name] = value
+    return metrics
+
+
+def compare(results, baseline, tolerance):
+    """
+    Регрессии относительно базовой линии: скорость (*_per_sec) упала или
+    время и память выросли больше чем на tolerance. Возвращает список
+    (метрика, базовое значение, текущее, относительное изменение).
+    """
+    current, base = flatten(results), flatten(baseline)
+    regressions = []
+    for name, old in sorted(base.items()):
+        new = current.get(name)
+        if new is None or not old:
+            continue
+        change = (new - old) / old
+        worse = -change if name.endswith("_per_sec") else change
+        if worse > tolerance:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замеры производительности УВМ на синтетических программах')
+    parser.add_argument('--output', help='Файл JSON с результатами (по умолчанию - stdout)')
+    parser.add_argument('--size', type=int, default=20000, help='Число команд в программе')
+    parser.add_argument('--patterns', nargs='+', choices=PATTERNS, default=list(PATTERNS),
+                        help='Шаблоны доступа к памяти')
+    parser.add_argument('--mix', help='Веса мнемоник, например "LOAD_CONST=4,READ_MEM=2"')
+    parser.add_argument('--stride', type=int, default=16, help='Шаг для шаблона strided')
+    parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора')
+    parser.add_argument('--engines', nargs='+', choices=sorted(ENGINES), help='Движки (по умолчанию - все)')
+    parser.add_argument('--memory', default='list', help='Тип памяти интерпретатора')
+    parser.add_argument('--repeat', type=int, default=3, help='Число повторов (берётся лучшее время)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Файл базовой линии для сравнения')
+    parser.add_argument('--save-baseline', action='store_true', help='Сохранить результаты как базовую линию')
+    parser.add_argument('--tolerance', type=float, default=0.20,
+                        help='Допустимое ухудшение относительно базовой линии (доля)')
+
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.size, args.patterns, parse_mix(args.mix) if args.mix else None, args.stride,
+                        args.seed, args.engines, args.memory, args.repeat)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        print(f"Базовая линия сохранена в {args.baseline}", file=sys.stderr)
+        return
+    if not os.path.exists(args.baseline):
+        print(f"Базовая линия {args.baseline} не найдена, сравнение пропущено", file=sys.stderr)
+        return
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get("params") != results["params"]:
+        print("Внимание: параметры замеров отличаются от базовой линии", file=sys.stderr)
+    regressions = compare(results, baseline, args.tolerance)
+    for name, old, new, change in regressions:
+        print(f"РЕГРЕССИЯ {name}: {old:.6g} -> {new:.6g} ({change:+.1%})", file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+    print(f"Регрессий нет (допуск {args.tolerance:.0%})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
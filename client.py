@@ -0,0 +1,68 @@
+# client.py: Клиент сервера УВМ (server.py)
+
+import argparse
+import json
+import os
+import socket
+import sys
+
+# Сокет по умолчанию (его же использует server.py). Клиент импортирует только
+# стандартные лёгкие модули: без tempfile и модулей УВМ запуск занимает миллисекунды
+_TEMP_DIR = next((os.environ[name] for name in ("TMPDIR", "TEMP", "TMP") if os.environ.get(name)), "/tmp")
+DEFAULT_SOCKET = os.path.join(_TEMP_DIR, f"uvm-{os.getuid()}.sock")
+
+
+class UVMClient:
+    """Соединение с сервером УВМ; запросы отправляются по одному соединению."""
+
+    def __init__(self, path=DEFAULT_SOCKET):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.file = self.sock.makefile('rwb')
+
+    def request(self, command, argv=(), cwd=None):
+        """Отправляет запрос и возвращает ответ: словарь с rc, stdout, stderr."""
+        request = {"command": command, "argv": list(argv), "cwd": cwd or os.getcwd()}
+        self.file.write(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("Сервер закрыл соединение")
+        return json.loads(line)
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Клиент сервера УВМ. Флаги после команды те же, что у assembler.py, '
+                    'interpreter.py и trace_dump.py соответственно')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='Путь к Unix-сокету сервера')
+    parser.add_argument('command', choices=['assemble', 'run', 'dump', 'ping', 'shutdown'],
+                        help='assemble - assembler.py, run - interpreter.py, dump - trace_dump.py')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='Флаги команды')
+
+    args = parser.parse_args(argv)
+
+    try:
+        with UVMClient(args.socket) as client:
+            response = client.request(args.command, args.args)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"Ошибка: Сервер УВМ не запущен ({args.socket}). Запустите server.py.", file=sys.stderr)
+        sys.exit(1)
+
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    sys.exit(response["rc"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# disassembler.py: Дизассемблер УВМ (векторизованное декодирование на NumPy)
+
+import argparse
+import sys
+import numpy as np
+from uvmspec import UVMSpec24
+
+# Структура декодированной команды: смещение в программе, код операции, поля
+INSTRUCTION_DTYPE = np.dtype([
+    ("offset", np.int64), ("A", np.uint8),
+    ("B", np.int64), ("C", np.int64), ("D", np.int64), ("E", np.int64),
+])
+
+# Таблица размеров команд для bytes.translate
+SIZE_TABLE = bytearray(256)
+for _opcode, _size in UVMSpec24.CMD_SIZES.items():
+    SIZE_TABLE[_opcode] = _size
+
+# Форматирование CSV: шаблон строки и маска столбцов B-E для каждого кода операции
+CSV_COLUMNS = "BCDE"
+CSV_TEMPLATES = np.full(256, "", dtype=object)
+CSV_COLUMN_MASKS = np.zeros((256, len(CSV_COLUMNS)), dtype=bool)
+for _opcode, _fields in UVMSpec24.FIELDS.items():
+    _names = [name for name, _, _ in _fields[1:]]
+    CSV_TEMPLATES[_opcode] = UVMSpec24.OPCODE_TO_MNEMONIC[_opcode] + ",%d" * len(_names) + "\n"
+    CSV_COLUMN_MASKS[_opcode] = [name in _names for name in CSV_COLUMNS]
+
+
+class Disassembly:
+    """Результат дизассемблирования: структурированный массив команд и ошибка (если была)."""
+
+    def __init__(self, instructions, error=None):
+        self.instructions = instructions
+        self.error = error  # (смещение, сообщение) или None
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def by_opcode(self, opcode):
+        """Команды одного кода операции (структурированный массив)."""
+        return self.instructions[self.instructions["A"] == opcode]
+
+    def to_csv_lines(self):
+        """Строки в формате, который принимает Assembler.parse_csv."""
+        return self.to_csv_text().splitlines()
+
+    def to_csv_text(self):
+        """
+        CSV-текст программы одним форматированием: шаблоны строк по кодам
+        операций склеиваются в одну строку формата, значения полей всех
+        команд подставляются в неё одной операцией %.
+        """
+        if not len(self.instructions):
+            return ""
+        opcodes = self.instructions["A"]
+        # Поля в FIELDS перечислены в порядке B, C, D, E: построчный выбор
+        # столбцов по маске даёт значения в порядке шаблона
+        values = np.column_stack([self.instructions[name] for name in CSV_COLUMNS])
+        template = "".join(CSV_TEMPLATES[opcodes].tolist())
+        return template % tuple(values[CSV_COLUMN_MASKS[opcodes]].tolist())
+
+
+def find_boundaries(data):
+    """Границы команд за один проход: смещения команд и ошибка декодирования (или None)."""
+    # Размер команды для каждого байта программы (0 - неизвестный код операции)
+    sizes = bytes(data).translate(SIZE_TABLE)
+    offsets = []
+    append = offsets.append
+    offset, total = 0, len(data)
+    while offset < total:
+        size = sizes[offset]
+        if not size:
+            return offsets, (offset, f"Неизвестный код операции: {data[offset]}")
+        append(offset)
+        offset += size
+    if offset > total:
+        offset = offsets.pop()
+        size = sizes[offset]
+        return offsets, (offset, f"Недостаточно байт для декодирования команды {data[offset]} "
+                                 f"начиная с {offset}. Ожидается {size}, доступно {total - offset}.")
+    return offsets, None
+
+
+def disassemble(data):
+    """
+    Декодирует бинарный код программы. Поля каждого класса команд извлекаются
+    векторными битовыми операциями NumPy по таблице UVMSpec24.FIELDS.
+    """
+    offsets, error = find_boundaries(data)
+    raw = np.frombuffer(data, dtype=np.uint8)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    result = np.zeros(len(offsets), dtype=INSTRUCTION_DTYPE)
+    result["offset"] = offsets
+    opcodes = raw[offsets] if len(offsets) else np.zeros(0, dtype=np.uint8)
+    result["A"] = opcodes
+
+    for opcode, fields in UVMSpec24.FIELDS.items():
+        mask = opcodes == opcode
+        if not mask.any():
+            continue
+        starts = offsets[mask]
+        # Слово команды little-endian из CMD_SIZES байт (не больше 8)
+        words = np.zeros(len(starts), dtype=np.uint64)
+        for i in range(UVMSpec24.CMD_SIZES[opcode]):
+            words |= raw[starts + i].astype(np.uint64) << np.uint64(8 * i)
+        for name, start_bit, end_bit in fields[1:]:
+            width = end_bit - start_bit + 1
+            values = ((words >> np.uint64(start_bit)) & np.uint64((1 << width) - 1)).astype(np.int64)
+            if name in UVMSpec24.SIGNED_FIELDS.get(opcode, ()):
+                values = np.where(values & (1 << (width - 1)), values - (1 << width), values)
+            result[name][mask] = values
+
+    return Disassembly(result, error)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Дизассемблер УВМ (вариант 24) - выводит CSV с мнемониками')
+    parser.add_argument('--input', required=True, help='Входной бинарный файл')
+    parser.add_argument('--output', help='Выходной CSV файл (по умолчанию - stdout)')
+
+    args = parser.parse_args()
+
+    try:
+        with open(args.input, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        print(f"Ошибка: Файл {args.input} не найден.", file=sys.stderr)
+        sys.exit(1)
+
+    result = disassemble(data)
+    text = result.to_csv_text()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"Дизассемблировано команд: {len(result)}", file=sys.stderr)
+    else:
+        sys.stdout.write(text)
+
+    if result.error:
+        offset, message = result.error
+        print(f"Ошибка декодирования команды на смещении {offset}: {message}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
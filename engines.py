@@ -0,0 +1,440 @@
+# engines.py: Альтернативные движки исполнения для интерпретатора УВМ
+
+import bisect
+import hashlib
+import sys
+from uvmspec import UVMSpec24
+
+
+class VMFault(Exception):
+    """Останов машины из-за ошибки исполнения (сообщение уже выведено)."""
+
+
+class ThreadedEngine:
+    """
+    Шитый код: при загрузке каждая команда привязывается к специализированному
+    обработчику-замыканию с уже подставленными операндами. Цикл исполнения
+    сводится к последовательным вызовам без поиска атрибутов и словарей.
+    """
+    name = "threaded"
+
+    def __init__(self, interp):
+        self.registers = interp.registers
+        self.memory = interp.memory
+        self.handlers = [self.bind(cmd) for cmd in interp.decoded]
+
+    def bind(self, cmd):
+        """Создаёт обработчик для одной предекодированной команды."""
+        if cmd.opcode == UVMSpec24.OP_LOAD:
+            return self._bind_load(cmd)
+        if cmd.opcode == UVMSpec24.OP_READ:
+            return self._bind_read(cmd)
+        if cmd.opcode == UVMSpec24.OP_WRITE:
+            return self._bind_write(cmd)
+        if cmd.opcode == UVMSpec24.OP_SHIFT_RIGHT:
+            return self._bind_shift(cmd)
+        raise ValueError(f"Неизвестный код операции: {cmd.opcode}")
+
+    def _bind_load(self, cmd):
+        regs = self.registers
+        reg_addr, const_val = cmd.b, cmd.c
+
+        def load_const():
+            regs[reg_addr] = const_val
+        return load_const
+
+    def _bind_read(self, cmd):
+        regs, mem, mem_size = self.registers, self.memory, len(self.memory)
+        offset, dest_reg_addr, base_reg_addr = cmd.b, cmd.c, cmd.d
+
+        def read_mem():
+            effective_address = regs[base_reg_addr] + offset
+            if 0 <= effective_address < mem_size:
+                regs[dest_reg_addr] = mem[effective_address]
+            else:
+                print(f"  ОШИБКА: Выход за границы памяти при READ по адресу {effective_address}", file=sys.stderr)
+                raise VMFault
+        return read_mem
+
+    def _bind_write(self, cmd):
+        regs, mem, mem_size = self.registers, self.memory, len(self.memory)
+        src_reg_addr, addr_reg_addr = cmd.b, cmd.c
+
+        def write_mem():
+            address_to_write = regs[addr_reg_addr]
+            if 0 <= address_to_write < mem_size:
+                mem[address_to_write] = regs[src_reg_addr]
+            else:
+                print(f"  ОШИБКА: Выход за границы памяти при WRITE по адресу {address_to_write}", file=sys.stderr)
+                raise VMFault
+        return write_mem
+
+    def _bind_shift(self, cmd):
+        regs, mem, mem_size = self.registers, self.memory, len(self.memory)
+        val_reg_addr, shift_reg_addr, shift_offset, base_reg_addr = cmd.b, cmd.c, cmd.d, cmd.e
+
+        def shift_right():
+            shift_amount = regs[shift_reg_addr] + shift_offset
+            effective_address = regs[base_reg_addr]
+            if shift_amount >= 32:
+                shifted_value = 0
+            elif shift_amount < 0:
+                shifted_value = 0
+                print(f"  ПРЕДУПРЕЖДЕНИЕ: Отрицательный сдвиг {shift_amount}, устанавливаем 0", file=sys.stderr)
+            else:
+                shifted_value = (regs[val_reg_addr] & 0xFFFFFFFF) >> shift_amount
+            if 0 <= effective_address < mem_size:
+                mem[effective_address] = shifted_value
+            else:
+                print(f"  ОШИБКА: Выход за границы памяти при SHIFT_RIGHT по адресу {effective_address}",
+                      file=sys.stderr)
+                raise VMFault
+        return shift_right
+
+    def execute(self, start, stop):
+        """
+        Выполняет команды с индексами [start, stop).
+        Возвращает индекс следующей невыполненной команды и признак ошибки.
+        """
+        i = start
+        try:
+            for i, handler in enumerate(self.handlers[start:stop], start):
+                handler()
+        except VMFault:
+            return i + 1, True
+        return stop, False
+
+
+def _report_fault(kind, address):
+    print(f"  ОШИБКА: Выход за границы памяти при {kind} по адресу {address}", file=sys.stderr)
+
+
+def _report_negative_shift(shift_amount):
+    print(f"  ПРЕДУПРЕЖДЕНИЕ: Отрицательный сдвиг {shift_amount}, устанавливаем 0", file=sys.stderr)
+
+
+# Кэш скомпилированных программ: (sha256 программы, размер памяти, размер блока) -> функции блоков.
+# Ограничен COMPILED_CACHE_LIMIT программами (LRU: порядок словаря - от давно использованных)
+_COMPILED_CACHE = {}
+COMPILED_CACHE_LIMIT = 64
+
+_REGS = ", ".join(f"r{i}" for i in range(8))
+
+
+class CompiledEngine(ThreadedEngine):
+    """
+    Компиляция программы в функции Python. В ISA нет ветвлений, поэтому каждый
+    блок из CHUNK_SIZE команд транслируется в одну прямолинейную функцию,
+    регистры которой хранятся в локальных переменных. Известные на этапе
+    компиляции значения регистров подставляются как константы, а проверки
+    границ для статически известных адресов выполняются при компиляции.
+
+    Блоки, которые нужно выполнить не целиком (лимит шагов, частичный запуск),
+    исполняются обработчиками шитого кода.
+    """
+    name = "compile"
+    CHUNK_SIZE = 256
+
+    def __init__(self, interp):
+        super().__init__(interp)
+        self.command_count = len(interp.decoded)
+        key = (hashlib.sha256(interp.program_data).digest(), len(self.memory), self.CHUNK_SIZE)
+        chunks = _COMPILED_CACHE.pop(key, None)
+        if chunks is None:
+            chunks = [self._compile_chunk(interp.decoded[i:i + self.CHUNK_SIZE])
+                      for i in range(0, len(interp.decoded), self.CHUNK_SIZE)]
+            while len(_COMPILED_CACHE) >= COMPILED_CACHE_LIMIT:
+                del _COMPILED_CACHE[next(iter(_COMPILED_CACHE))]
+        _COMPILED_CACHE[key] = chunks  # В конец - как последний использованный
+        self.chunks = chunks
+
+    def _compile_chunk(self, commands):
+        """Генерирует и компилирует функцию для блока команд."""
+        source = self.generate_source(commands, len(self.memory))
+        namespace = {"fault": _report_fault, "warn": _report_negative_shift}
+        exec(compile(source, f"<uvm chunk {commands[0].index}>", "exec"), namespace)
+        return namespace["chunk"]
+
+    @staticmethod
+    def generate_source(commands, mem_size):
+        """
+        Возвращает исходный код функции chunk(regs, mem, mem_size) для блока команд.
+        Функция возвращает -1 или индекс команды, на которой произошла ошибка.
+        """
+        lines = ["def chunk(regs, mem, mem_size):", f"    {_REGS} = regs"]
+        stop = f"regs[:] = ({_REGS})"
+        known = {}  # Регистры со значениями, известными при компиляции
+
+        def emit(*code):
+            lines.extend("    " + line for line in code)
+
+        def in_range(address):
+            return 0 <= address < mem_size
+
+        for cmd in commands:
+            if cmd.opcode == UVMSpec24.OP_LOAD:
+                known[cmd.b] = cmd.c
+                emit(f"r{cmd.b} = {cmd.c}")
+
+            elif cmd.opcode == UVMSpec24.OP_READ:
+                offset, dest, base = cmd.b, cmd.c, cmd.d
+                if base in known:
+                    address = known[base] + offset
+                    if not in_range(address):
+                        emit(stop, f"fault('READ', {address})", f"return {cmd.index}")
+                        break
+                    emit(f"r{dest} = mem[{address}]")
+                else:
+                    emit(f"a = r{base} + {offset}",
+                         "if not 0 <= a < mem_size:",
+                         f"    {stop}", "    fault('READ', a)", f"    return {cmd.index}",
+                         f"r{dest} = mem[a]")
+                known.pop(dest, None)
+
+            elif cmd.opcode == UVMSpec24.OP_WRITE:
+                src, addr = cmd.b, cmd.c
+                value = repr(known[src]) if src in known else f"r{src}"
+                if addr in known:
+                    if not in_range(known[addr]):
+                        emit(stop, f"fault('WRITE', {known[addr]})", f"return {cmd.index}")
+                        break
+                    emit(f"mem[{known[addr]}] = {value}")
+                else:
+                    emit(f"a = r{addr}",
+                         "if not 0 <= a < mem_size:",
+                         f"    {stop}", "    fault('WRITE', a)", f"    return {cmd.index}",
+                         f"mem[a] = {value}")
+
+            elif cmd.opcode == UVMSpec24.OP_SHIFT_RIGHT:
+                src, shift_reg, shift_offset, base = cmd.b, cmd.c, cmd.d, cmd.e
+                if shift_reg >= 8:
+                    # Поле C шире номера регистра: как и в пошаговом цикле, это IndexError
+                    emit(stop, "raise IndexError('list index out of range')")
+                    break
+                if shift_reg in known:
+                    shift_amount = known[shift_reg] + shift_offset
+                    if shift_amount >= 32:
+                        emit("v = 0")
+                    elif shift_amount < 0:
+                        emit("v = 0", f"warn({shift_amount})")
+                    elif src in known:
+                        emit(f"v = {(known[src] & 0xFFFFFFFF) >> shift_amount}")
+                    else:
+                        emit(f"v = (r{src} & 0xFFFFFFFF) >> {shift_amount}")
+                else:
+                    emit(f"s = r{shift_reg} + {shift_offset}",
+                         "if s >= 32:", "    v = 0",
+                         "elif s < 0:", "    v = 0", "    warn(s)",
+                         "else:", f"    v = (r{src} & 0xFFFFFFFF) >> s")
+                if base in known:
+                    if not in_range(known[base]):
+                        emit(stop, f"fault('SHIFT_RIGHT', {known[base]})", f"return {cmd.index}")
+                        break
+                    emit(f"mem[{known[base]}] = v")
+                else:
+                    emit(f"a = r{base}",
+                         "if not 0 <= a < mem_size:",
+                         f"    {stop}", "    fault('SHIFT_RIGHT', a)", f"    return {cmd.index}",
+                         "mem[a] = v")
+        else:
+            emit(stop, "return -1")
+
+        return "\n".join(lines) + "\n"
+
+    def execute(self, start, stop):
+        """Выполняет команды [start, stop): целые блоки - скомпилированными функциями."""
+        regs, mem, mem_size = self.registers, self.memory, len(self.memory)
+        size = self.CHUNK_SIZE
+        index = start
+        while index < stop:
+            chunk_no, offset = divmod(index, size)
+            chunk_end = min((chunk_no + 1) * size, self.command_count)
+            if offset == 0 and chunk_end <= stop:
+                fault_index = self.chunks[chunk_no](regs, mem, mem_size)
+                if fault_index >= 0:
+                    return fault_index + 1, True
+                index = chunk_end
+            else:
+                index, faulted = super().execute(index, min(chunk_end, stop))
+                if faulted:
+                    return index, True
+        return index, False
+
+
+# Шаблоны кода команд для слитых обработчиков; {k} - позиция команды в цепочке
+_FUSION_SNIPPETS = {
+    UVMSpec24.OP_LOAD: ("regs[b{k}] = c{k}",),
+    UVMSpec24.OP_READ: (
+        "a = regs[d{k}] + b{k}",
+        "if not 0 <= a < mem_size:",
+        "    fault('READ', a)",
+        "    raise VMFault({k})",
+        "regs[c{k}] = mem[a]",
+    ),
+    UVMSpec24.OP_WRITE: (
+        "a = regs[c{k}]",
+        "if not 0 <= a < mem_size:",
+        "    fault('WRITE', a)",
+        "    raise VMFault({k})",
+        "mem[a] = regs[b{k}]",
+    ),
+    UVMSpec24.OP_SHIFT_RIGHT: (
+        "s = regs[c{k}] + d{k}",
+        "a = regs[e{k}]",
+        "if s >= 32:",
+        "    v = 0",
+        "elif s < 0:",
+        "    v = 0",
+        "    warn(s)",
+        "else:",
+        "    v = (regs[b{k}] & 0xFFFFFFFF) >> s",
+        "if not 0 <= a < mem_size:",
+        "    fault('SHIFT_RIGHT', a)",
+        "    raise VMFault({k})",
+        "mem[a] = v",
+    ),
+}
+
+# Операнды команды, передаваемые в слитый обработчик
+_FUSION_OPERANDS = {
+    UVMSpec24.OP_LOAD: "bc",
+    UVMSpec24.OP_READ: "bcd",
+    UVMSpec24.OP_WRITE: "bc",
+    UVMSpec24.OP_SHIFT_RIGHT: "bcde",
+}
+
+# Фабрики слитых обработчиков: последовательность кодов операций -> make(regs, mem, mem_size, *операнды)
+_FUSION_FACTORIES = {}
+
+
+def _fusion_factory(opcodes):
+    """Генерирует (один раз на последовательность кодов операций) фабрику слитого обработчика."""
+    factory = _FUSION_FACTORIES.get(opcodes)
+    if factory is None:
+        params = [f"{name}{k}" for k, opcode in enumerate(opcodes) for name in _FUSION_OPERANDS[opcode]]
+        lines = [f"def make(regs, mem, mem_size, {', '.join(params)}):", "    def fused():"]
+        for k, opcode in enumerate(opcodes):
+            lines.extend("        " + line.format(k=k) for line in _FUSION_SNIPPETS[opcode])
+        lines.append("    return fused")
+        namespace = {"fault": _report_fault, "warn": _report_negative_shift, "VMFault": VMFault}
+        name = "+".join(UVMSpec24.OPCODE_TO_MNEMONIC[opcode] for opcode in opcodes)
+        exec(compile("\n".join(lines) + "\n", f"<uvm fusion {name}>", "exec"), namespace)
+        factory = _FUSION_FACTORIES[opcodes] = namespace["make"]
+    return factory
+
+
+class FusedEngine(ThreadedEngine):
+    """
+    Шитый код со слиянием команд (суперинструкции). При загрузке в программе
+    подсчитываются цепочки кодов операций длиной до MAX_LENGTH, и частые из них
+    (не реже MIN_COUNT раз) заменяются одним обработчиком, выполняющим работу
+    всей цепочки за один вызов. Слитый обработчик при ошибке сообщает позицию
+    команды в цепочке, поэтому останов и подсчёт шагов совпадают с пошаговым
+    исполнением. Цепочка, не помещающаяся целиком в исполняемый диапазон,
+    выполняется обычными обработчиками.
+    """
+    name = "fused"
+    MAX_LENGTH = 3
+    MIN_COUNT = 4
+
+    def __init__(self, interp):
+        super().__init__(interp)
+        decoded = interp.decoded
+        opcodes = self._fusable_opcodes(decoded)
+        self.patterns = self.select_patterns(opcodes)
+        # Программа, разбитая на элементы: слитые цепочки и одиночные команды
+        self.entries = []  # Обработчики элементов по порядку
+        self.entry_start = []  # Индекс первой команды элемента
+        self.entry_end = []  # Индекс команды после элемента
+        self.entry_at = [-1] * (len(decoded) + 1)  # Индекс команды -> номер элемента (-1 внутри цепочки)
+        self.sites = {}  # Последовательность кодов операций -> индексы начала её мест (по возрастанию)
+        mem_size = len(self.memory)
+        index = 0
+        while index < len(decoded):
+            self.entry_at[index] = len(self.entries)
+            length = 1
+            for candidate in range(self.MAX_LENGTH, 1, -1):
+                chain = tuple(opcodes[index:index + candidate])
+                if chain in self.patterns:
+                    operands = [getattr(cmd, name) for cmd in decoded[index:index + candidate]
+                                for name in _FUSION_OPERANDS[cmd.opcode]]
+                    self.entries.append(_fusion_factory(chain)(self.registers, self.memory, mem_size, *operands))
+                    self.sites.setdefault(chain, []).append(index)
+                    length = candidate
+                    break
+            else:
+                self.entries.append(self.handlers[index])
+            self.entry_start.append(index)
+            index += length
+            self.entry_end.append(index)
+        self.entry_at[len(decoded)] = len(self.entries)
+        self.fired = dict.fromkeys(self.sites, 0)  # Срабатывания слитых обработчиков
+
+    @staticmethod
+    def _fusable_opcodes(decoded):
+        """Коды операций команд; None - команда, которую нельзя сливать."""
+        # SHIFT_RIGHT с номером регистра C вне диапазона завершается исключением
+        return [None if cmd.opcode == UVMSpec24.OP_SHIFT_RIGHT and cmd.c >= 8 else cmd.opcode
+                for cmd in decoded]
+
+    @classmethod
+    def select_patterns(cls, opcodes):
+        """Частые цепочки кодов операций длиной от 2 до MAX_LENGTH."""
+        counts = {}
+        for length in range(2, cls.MAX_LENGTH + 1):
+            for chain in zip(*(opcodes[shift:] for shift in range(length))):
+                counts[chain] = counts.get(chain, 0) + 1
+        return {chain for chain, count in counts.items() if count >= cls.MIN_COUNT and None not in chain}
+
+    def execute(self, start, stop):
+        """Выполняет команды [start, stop); слитые цепочки - одним вызовом."""
+        handlers = self.handlers
+        index = start
+        try:
+            # Начало внутри цепочки: её остаток выполняется обычными обработчиками
+            while index < stop and self.entry_at[index] < 0:
+                handlers[index]()
+                index += 1
+            if index < stop:
+                first = self.entry_at[index]
+                last = bisect.bisect_right(self.entry_end, stop, first)  # Элементы, целиком лежащие до stop
+                entry = first
+                try:
+                    for entry, handler in enumerate(self.entries[first:last], first):
+                        handler()
+                except VMFault as fault:
+                    reached = self.entry_start[entry] + (fault.args[0] if fault.args else 0) + 1
+                    self._count_fired(start, stop, reached)
+                    return reached, True
+                if last > first:
+                    index = self.entry_end[last - 1]
+            # Хвост: цепочка, пересекающая stop, выполняется обычными обработчиками
+            while index < stop:
+                handlers[index]()
+                index += 1
+        except VMFault:
+            self._count_fired(start, stop, index + 1)
+            return index + 1, True
+        self._count_fired(start, stop, stop)
+        return stop, False
+
+    def _count_fired(self, start, stop, reached):
+        """
+        Учитывает слитые обработчики, вызванные при исполнении [start, reached):
+        места, начинающиеся в этом диапазоне, кроме выходящего за stop.
+        """
+        for chain, starts in self.sites.items():
+            lo = bisect.bisect_left(starts, start)
+            hi = bisect.bisect_left(starts, reached)
+            if hi > lo and starts[hi - 1] + len(chain) > stop:
+                hi -= 1
+            self.fired[chain] += hi - lo
+
+    def report(self):
+        """
+        Отчёт о слияниях: цепочка мнемоник -> число мест в программе и число
+        срабатываний слитых обработчиков в выполненных диапазонах.
+        """
+        return {"+".join(UVMSpec24.OPCODE_TO_MNEMONIC[opcode] for opcode in chain):
+                {"sites": len(starts), "fired": self.fired[chain]}
+                for chain, starts in sorted(self.sites.items(), key=lambda item: -len(item[1]))}
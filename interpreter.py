@@ -1,29 +1,184 @@
 # interpreter.py: Интерпретатор УВМ
 
-import json
 import struct
 import argparse
+import asyncio
+import hashlib
 import sys
+import time
 from uvmspec import UVMSpec24  # Импортируем спецификацию
+from engines import ThreadedEngine, CompiledEngine, FusedEngine
+from memory import MEMORY_BACKENDS, capture_image, create_memory, enable_write_tracking, restore_image
+from memdump import DUMP_FORMATS, DUMP_MODES, find_mismatches, load_dump, write_diff, write_dump
+from tracing import (TRACE_ABORTED, TRACE_DECODE_ERROR, TRACE_END, TRACE_FAULT, TRACE_NEGATIVE_SHIFT,
+                     TextTracer, TraceFile, TraceRing, TracerGroup, event_messages)
+from profiling import ExecutionProfile
+from snapshot import VMSnapshot
+from uvmo import CommandTable, ObjectFile, PcTable, is_object_file
+
+COMPARE_REPORT_LIMIT = 20  # Сколько расхождений с эталоном выводить (--compare)
+
+# Доступные движки исполнения: classic - пошаговый цикл выборки-исполнения
+ENGINES = {
+    "classic": None,
+    "threaded": ThreadedEngine,
+    "compile": CompiledEngine,
+    "fused": FusedEngine,
+}
+
+
+# Знаковые поля по кодам операций: (атрибут DecodedCommand, ширина поля)
+SIGNED_ATTRS = {
+    opcode: tuple((name.lower(), end_bit - start_bit + 1)
+                  for name, start_bit, end_bit in UVMSpec24.FIELDS[opcode] if name in names)
+    for opcode, names in UVMSpec24.SIGNED_FIELDS.items()
+}
+
+
+class DecodedCommand:
+    """
+    Предекодированная команда: поля уже извлечены и знаково расширены.
+    Хранятся только операнды, нужные для исполнения (словарь полей не сохраняется).
+    """
+    __slots__ = ("pc", "index", "size", "opcode", "b", "c", "d", "e")
+
+    def __init__(self, pc, index, size, fields):
+        self.pc = pc
+        self.index = index  # Порядковый номер команды в программе
+        self.size = size
+        self.opcode = fields["A"]
+        self.b = fields.get("B")
+        self.c = fields.get("C")
+        self.d = fields.get("D")
+        self.e = fields.get("E")
+
+    @property
+    def raw(self):
+        """Исходные (беззнаковые) поля B, C, D, E для записи трассировки."""
+        # Отрицательными бывают только знаково расширенные 13-битные поля
+        return tuple(0 if value is None else value & 0x1FFF if value < 0 else value
+                     for value in (self.b, self.c, self.d, self.e))
+
 
 
 class Interpreter:
-    def __init__(self, memory_size=65536):  # Объединённая память, как в требованиях
-        # Объединённая память для данных и кода
-        self.memory = [0] * memory_size
+    TIME_SLICE = 4096  # Шагов между проверками лимита времени
+    # Кэш предекодированных программ: sha256 программы -> (decoded, pc_table, decode_error).
+    # None - выключен; долгоживущий процесс (server.py) подставляет сюда словарь
+    decode_cache = None
+
+    def __init__(self, memory_size=65536, engine="classic", memory="list", max_steps=10000, time_limit=None,
+                 track_writes=False):  # Объединённая память, как в требованиях
+        if engine not in ENGINES:
+            raise ValueError(f"Неизвестный движок исполнения: {engine}")
+        # Объединённая память для данных и кода (см. memory.py)
+        self.memory = create_memory(memory, memory_size)
+        # Отслеживание записей для дампов изменений и быстрого сравнения с эталоном
+        self.track_writes = track_writes
+        if track_writes:
+            enable_write_tracking(self.memory, zeroed=True)  # Новая память заполнена нулями
         # Регистры
         self.registers = [0] * 8
         self.pc = 0  # Program Counter
         self.running = False
         self.spec = UVMSpec24()  # Используем спецификацию из uvmspec.py
-
-    def load_program(self, binary_file_path):
-        """Загружает бинарный файл программы."""
+        self.program_data = b''
+        # Таблица предекодированных команд: по порядку и по значению PC
+        self.decoded = []
+        self.pc_table = {}
+        self.decode_error = None
+        self.engine = engine
+        self._engine = None
+        self.tracer = None  # Приёмник записей трассировки (None - выключена)
+        self.step = 0  # Номер текущего шага
+        self.halted = False  # Программа завершена (конец, ошибка) - step_n больше не исполняет команд
+        # Бюджет исполнения: не больше max_steps шагов (+1 до сообщения о лимите) и time_limit секунд
+        self.max_steps = max_steps
+        self.time_limit = time_limit
+
+    def load_program(self, binary_file_path, verify=False):
+        """
+        Загружает бинарный файл программы (.bin или объектный файл uvmo).
+        Объектный файл отображается в память: код не копируется, а команды
+        декодируются по индексу при первом обращении. verify - сверить
+        контрольную сумму объектного файла (индекс, операнды и код).
+        """
+        if is_object_file(binary_file_path):
+            self.load_object(ObjectFile(binary_file_path), verify)
+            return
         with open(binary_file_path, 'rb') as f:
-            self.program_data = f.read()
+            self.load_program_data(f.read())
+
+    def load_object(self, obj, verify=False):
+        """
+        Загружает программу из открытого объектного файла (uvmo.ObjectFile).
+        Постоянное время загрузки - только для движка classic: он декодирует
+        команды по мере исполнения. Движки threaded, compile и fused строят
+        обработчики для всех команд при загрузке и декодируют объект целиком.
+        """
+        if verify:
+            obj.verify()
+        self.program_data = obj.code  # memoryview поверх mmap
+        self.pc = 0
+        self.halted = False
+        # Код объектного файла декодируется целиком (проверено ассемблером)
+        self.decoded = CommandTable(obj, self.make_command)
+        self.pc_table = PcTable(self.decoded)
+        self.decode_error = None
+        engine_class = ENGINES[self.engine]
+        self._engine = engine_class(self) if engine_class else None
+        print(f"Программа загружена. Размер: {len(self.program_data)} байт "
+              f"(объектный файл, команд {obj.count}).", file=sys.stderr)
+
+    def load_program_data(self, data):
+        """Загружает программу из байтов (без чтения файла)."""
+        self.program_data = bytes(data)
         self.pc = 0  # Сбросить PC при загрузке новой программы
+        self.halted = False
+        cache = self.decode_cache
+        key = hashlib.sha256(self.program_data).digest() if cache is not None else None
+        if key is not None and key in cache:
+            self.decoded, self.pc_table, self.decode_error = cache[key]
+        else:
+            self.predecode()
+            if key is not None:
+                cache[key] = (self.decoded, self.pc_table, self.decode_error)
+        engine_class = ENGINES[self.engine]
+        self._engine = engine_class(self) if engine_class else None
         print(f"Программа загружена. Размер: {len(self.program_data)} байт.", file=sys.stderr)
 
+    def predecode(self):
+        """
+        Однократно декодирует всю программу: список команд по порядку и словарь
+        PC -> команда (только для границ команд, а не для каждого байта).
+        Команды без ветвлений, поэтому границы команд идут подряд от нуля.
+        Декодирование останавливается на первой некорректной команде; ошибка
+        сохраняется и сообщается при выполнении, когда PC дойдёт до неё.
+        """
+        self.decoded = []
+        self.pc_table = {}
+        self.decode_error = None
+
+        offset = 0
+        while offset < len(self.program_data):
+            try:
+                fields, size = self.decode_command(offset)
+            except ValueError as e:
+                self.decode_error = str(e)
+                break
+
+            cmd = self.make_command(offset, len(self.decoded), size, fields)
+            self.decoded.append(cmd)
+            self.pc_table[offset] = cmd
+            offset += size
+
+    def make_command(self, pc, index, size, fields):
+        """Предекодированная команда по исходным полям (со знаковым расширением операндов)."""
+        cmd = DecodedCommand(pc, index, size, fields)
+        for attr, width in SIGNED_ATTRS.get(cmd.opcode, ()):
+            setattr(cmd, attr, self.spec.sign_extend(getattr(cmd, attr), width))
+        return cmd
+
     def decode_command(self, offset):
         """Декодирует одну команду из бинарных данных по смещению."""
         # Сначала читаем байт A
@@ -58,157 +213,350 @@ class Interpreter:
         return fields, size
 
     def fetch_decode_execute_cycle(self):
-        """Выполняет один цикл выборки-декодирования-исполнения."""
+        """
+        Выполняет один цикл выборки-декодирования-исполнения. Текст журнала на
+        каждом шаге не формируется: при включённой трассировке шаг передаётся
+        трассировщику одной записью (см. tracing.py).
+        """
+        tracer = self.tracer
         if self.pc >= len(self.program_data):
             self.running = False
+            if tracer is not None:
+                tracer.record(self.step, self.pc, 0, TRACE_END, 0, 0, 0, 0, 0, 0, 0, 0)
             return
 
-        # 1. Fetch: Получаем команду
+        # 1. Fetch: Берём команду из предекодированной таблицы
         current_pc_before_cmd = self.pc
-        try:
-            command_fields, cmd_size = self.decode_command(self.pc)
-        except ValueError as e:
-            print(f"Ошибка декодирования команды на PC={self.pc}: {e}", file=sys.stderr)
+        cmd = self.pc_table.get(self.pc)
+        if cmd is None:
             self.running = False
+            if tracer is not None:
+                available = len(self.program_data) - self.pc
+                tracer.record(self.step, self.pc, self.program_data[self.pc], TRACE_DECODE_ERROR,
+                              available, 0, 0, 0, 0, 0, 0, 0)
+            if tracer is None or not tracer.echoes_messages:
+                print(f"Ошибка декодирования команды на PC={self.pc}: {self.decode_error}", file=sys.stderr)
             return
 
-        self.pc += cmd_size
-        print(f"PC={current_pc_before_cmd}, Команда: {command_fields}, Размер: {cmd_size}", file=sys.stderr)
-
-        # 2. Decode & Execute: Исполняем команду
-        opcode = command_fields["A"]
-        if opcode == self.spec.OP_LOAD:
-            reg_addr = command_fields["B"]
-            const_val = command_fields["C"]
-            # Знаковая интерпретация 13-битного числа
-            if const_val & (1 << 12):  # Если установлен 12-й бит (знаковый)
-                const_val = const_val - (1 << 13)
-            self.registers[reg_addr] = const_val
-            print(f"  LOAD_CONST R{reg_addr} <- {const_val} (R={self.registers[reg_addr]})", file=sys.stderr)
-
-        elif opcode == self.spec.OP_READ:
-            offset = command_fields["B"]
-            base_reg_addr = command_fields["D"]
-            dest_reg_addr = command_fields["C"]
-
-            # Знаковая интерпретация 13-битного смещения
-            if offset & (1 << 12):
-                offset = offset - (1 << 13)
-
-            base_address = self.registers[base_reg_addr]
-            effective_address = base_address + offset
-            if 0 <= effective_address < len(self.memory):
-                self.registers[dest_reg_addr] = self.memory[effective_address]
-            else:
-                print(f"  ОШИБКА: Выход за границы памяти при READ по адресу {effective_address}", file=sys.stderr)
-                self.running = False
-                return
-            print(
-                f"  READ_MEM M[R{base_reg_addr}+{offset}] -> R{dest_reg_addr} (M[{effective_address}]={self.registers[dest_reg_addr]})",
-                file=sys.stderr)
-
-        elif opcode == self.spec.OP_WRITE:
-            src_reg_addr = command_fields["B"]
-            addr_reg_addr = command_fields["C"]
-            value_to_write = self.registers[src_reg_addr]
-            address_to_write = self.registers[addr_reg_addr]
-            if 0 <= address_to_write < len(self.memory):
-                self.memory[address_to_write] = value_to_write
-            else:
-                print(f"  ОШИБКА: Выход за границы памяти при WRITE по адресу {address_to_write}", file=sys.stderr)
-                self.running = False
-                return
-            print(f"  WRITE_MEM R{src_reg_addr}(={value_to_write}) -> M[R{addr_reg_addr}](={address_to_write})",
-                  file=sys.stderr)
-
-        elif opcode == self.spec.OP_SHIFT_RIGHT:
-            val_reg_addr = command_fields["B"]
-            shift_reg_addr = command_fields["C"]
-            shift_offset = command_fields["D"]
-            base_reg_addr = command_fields["E"]
-
-            # Знаковая интерпретация 13-битного смещения
-            if shift_offset & (1 << 12):
-                shift_offset = shift_offset - (1 << 13)
-
-            # Вычисляем сдвиг
-            shift_amount = self.registers[shift_reg_addr] + shift_offset
-            base_address = self.registers[base_reg_addr]
-
-            # Значение для сдвига
-            value_to_shift = self.registers[val_reg_addr]
-
-            # Логический сдвиг вправо
-            if shift_amount >= 32:
-                shifted_value = 0
-            elif shift_amount < 0:
-                # Не определено поведение для отрицательного сдвига, установим в 0
-                shifted_value = 0
-                print(f"  ПРЕДУПРЕЖДЕНИЕ: Отрицательный сдвиг {shift_amount}, устанавливаем 0", file=sys.stderr)
-            else:
-                shifted_value = (value_to_shift & 0xFFFFFFFF) >> shift_amount
-
-            # Записываем результат в память по вычисленному адресу
-            effective_address = base_address
-            if 0 <= effective_address < len(self.memory):
-                self.memory[effective_address] = shifted_value
-            else:
-                print(f"  ОШИБКА: Выход за границы памяти при SHIFT_RIGHT по адресу {effective_address}",
-                      file=sys.stderr)
-                self.running = False
-                return
+        self.pc += cmd.size
 
-            print(
-                f"  SHIFT_RIGHT R{val_reg_addr}(={value_to_shift}) >> {shift_amount} -> M[R{base_reg_addr}](={effective_address}), Val={shifted_value}",
-                file=sys.stderr)
+        # 2. Execute: Исполняем команду (операнды уже знаково расширены)
+        opcode = cmd.opcode
+        flags = 0
+        address = value = operand = shift_amount = 0
+        try:
+            if opcode == self.spec.OP_LOAD:
+                value = cmd.c
+                self.registers[cmd.b] = value
+
+            elif opcode == self.spec.OP_READ:
+                # Адрес: регистр базы (D) + смещение (B), результат в регистр C
+                address = self.registers[cmd.d] + cmd.b
+                if 0 <= address < len(self.memory):
+                    value = self.memory[address]
+                    self.registers[cmd.c] = value
+                else:
+                    flags = TRACE_FAULT
 
-        else:
-            print(f"Неизвестная команда: {opcode}", file=sys.stderr)
-            self.running = False
+            elif opcode == self.spec.OP_WRITE:
+                value = self.registers[cmd.b]
+                address = self.registers[cmd.c]
+                if 0 <= address < len(self.memory):
+                    self.memory[address] = value
+                else:
+                    flags = TRACE_FAULT
+
+            elif opcode == self.spec.OP_SHIFT_RIGHT:
+                # Сдвиг на регистр C + смещение D, результат в память по адресу из регистра E
+                shift_amount = self.registers[cmd.c] + cmd.d
+                address = self.registers[cmd.e]
+                operand = self.registers[cmd.b]
+
+                # Логический сдвиг вправо
+                if shift_amount >= 32:
+                    value = 0
+                elif shift_amount < 0:
+                    # Не определено поведение для отрицательного сдвига, установим в 0
+                    flags = TRACE_NEGATIVE_SHIFT
+                else:
+                    value = (operand & 0xFFFFFFFF) >> shift_amount
+
+                if 0 <= address < len(self.memory):
+                    self.memory[address] = value
+                else:
+                    flags |= TRACE_FAULT
+        except Exception:
+            # Команда прервана исключением (например, номер регистра вне диапазона)
+            if tracer is not None:
+                tracer.record(self.step, current_pc_before_cmd, opcode, TRACE_ABORTED, *cmd.raw, 0, 0, 0, 0)
+            raise
+
+        if tracer is not None:
+            tracer.record(self.step, current_pc_before_cmd, opcode, flags, *cmd.raw,
+                          address, value, operand, shift_amount)
+        if flags:
+            if tracer is None or not tracer.echoes_messages:
+                for line in event_messages(opcode, flags, address, shift_amount):
+                    print(line, file=sys.stderr)
+            if flags & TRACE_FAULT:
+                self.running = False
 
-    def run(self, trace=False):
-        """Запускает выполнение программы."""
+    def snapshot(self):
+        """
+        Снимок состояния (PC, регистры, память). Память снимается постранично
+        (см. memory.capture_image): копируются только страницы, записанные после
+        прошлого снимка или восстановления. Первый снимок list, u32, s32 и bytes
+        копирует память целиком и включает учёт записанных страниц, который
+        замедляет запись в память.
+        """
+        return VMSnapshot(self.pc, self.registers, capture_image(self.memory))
+
+    def restore(self, snap):
+        """
+        Восстанавливает состояние из снимка; последующий run() продолжит
+        исполнение с PC снимка. Снимок можно восстанавливать многократно, в том
+        числе после загрузки другой программы с тем же началом.
+        """
+        self.pc = snap.pc
+        self.halted = False
+        self.registers[:] = snap.registers
+        if self.memory.name == snap.memory.name and len(self.memory) == len(snap.memory):
+            # На месте: переписываются только изменённые страницы, движок продолжает
+            # работать с тем же объектом памяти
+            restore_image(self.memory, snap.memory)
+        else:
+            self.memory = snap.memory_copy(self.memory.name)
+            # Движки захватывают память при построении - пересоздаём
+            engine_class = ENGINES[self.engine]
+            self._engine = engine_class(self) if engine_class else None
+        if self.track_writes:
+            enable_write_tracking(self.memory)  # Исходный образ - память снимка (с ненулевыми ячейками)
+
+    def pc_index(self):
+        """Порядковый номер команды, на которую указывает PC."""
+        cmd = self.pc_table.get(self.pc)
+        return cmd.index if cmd is not None else len(self.decoded)
+
+    def step_n(self, k):
+        """
+        Выполняет не более k шагов с текущего PC и возвращает число выполненных.
+        Завершающий шаг (конец программы, ошибка декодирования или доступа
+        к памяти) останавливает машину: дальнейшие вызовы возвращают 0.
+        Без трассировки команды исполняет выбранный движок.
+        """
+        if self.halted or k <= 0:
+            return 0
         self.running = True
-        step = 0
-        while self.running:
-            if trace:
-                print(f"--- Шаг {step} ---", file=sys.stderr)
-            self.fetch_decode_execute_cycle()
-            step += 1
-            # Защита от бесконечного цикла в случае ошибки декодирования
-            if step > 10000:
-                print("Достигнут лимит шагов (10000), возможно зацикливание.", file=sys.stderr)
-                break
+        engine = self._engine if self.tracer is None else None
+        if engine is None:
+            executed = 0
+            while self.running and executed < k:
+                self.fetch_decode_execute_cycle()
+                self.step += 1
+                executed += 1
+        else:
+            start = self.pc_index()
+            index, faulted = engine.execute(start, min(len(self.decoded), start + k))
+            executed = index - start
+            if index > start:
+                last = self.decoded[index - 1]
+                self.pc = last.pc + last.size
+            if faulted:
+                self.running = False
+            elif executed < k:
+                # Завершающий цикл: конец программы или ошибка декодирования
+                self.fetch_decode_execute_cycle()
+                executed += 1
+            self.step += executed
+        if not self.running:
+            self.halted = True
+        return executed
+
+    def _slice(self, remaining):
+        """
+        Размер очередного отрезка исполнения при ограничении по времени.
+        Границы выровнены по TIME_SLICE команд, чтобы не дробить блоки движка compile.
+        """
+        return min(remaining, self.TIME_SLICE - self.pc_index() % self.TIME_SLICE)
+
+    def _budget_exceeded(self, deadline):
+        """Проверяет лимиты шагов и времени; при превышении сообщает и возвращает True."""
+        if self.step > self.max_steps:
+            print(f"Достигнут лимит шагов ({self.max_steps}), возможно зацикливание.", file=sys.stderr)
+            return True
+        if deadline is not None and not self.halted and time.perf_counter() >= deadline:
+            print(f"Достигнут лимит времени ({self.time_limit} с), выполнение остановлено.", file=sys.stderr)
+            return True
+        return False
+
+    def run(self, trace=False, tracer=None, profile=None):
+        """
+        Запускает выполнение программы. trace=True печатает текстовый журнал
+        шагов; tracer - приёмник бинарных записей (TraceFile, TraceRing).
+        profile=True или экземпляр ExecutionProfile включает профилирование;
+        тогда собранная статистика возвращается из run.
+        Исполнение ограничено max_steps шагами и time_limit секундами.
+        """
+        if tracer is None and trace:
+            tracer = TextTracer(sys.stderr)
+        if profile is True:
+            profile = ExecutionProfile()
+        if profile:
+            tracer = TracerGroup(tracer, profile) if tracer is not None else profile
+        self.tracer = tracer
+        self.halted = False
+        self.step = 0
+        start_index = self.pc_index()
+        start_time = time.perf_counter()
+        deadline = start_time + self.time_limit if self.time_limit is not None else None
+        # Трассировка поддерживается только классическим движком
+        engine = self._engine if tracer is None else None
+        try:
+            while not self.halted:
+                remaining = self.max_steps + 1 - self.step
+                self.step_n(remaining if deadline is None else self._slice(remaining))
+                if self._budget_exceeded(deadline):
+                    break
+        finally:
+            self.tracer = None
+        step = self.step
+        elapsed = time.perf_counter() - start_time
+        executed = self.pc_index() - start_index
         print(f"Выполнение завершено за {step} шагов.", file=sys.stderr)
-
-    def dump_memory(self, output_file, start_addr=0, end_addr=None):
-        """Сохраняет дамп памяти в файл (JSON)."""
+        if not trace:
+            # Скорость меняется от запуска к запуску - в текстовый журнал (эталонные логи) не попадает
+            rate = executed / elapsed if elapsed > 0 else 0.0
+            print(f"Скорость: {rate:.0f} команд/с (движок: {engine.name if engine else 'classic'})", file=sys.stderr)
+        if profile:
+            profile.steps += step
+            return profile
+        return None
+
+    async def run_async(self, budget_per_slice=1000, progress=None):
+        """
+        Кооперативное исполнение для asyncio: после каждых budget_per_slice
+        шагов управление возвращается циклу событий, так что в одном процессе
+        можно честно чередовать много машин. Лимиты max_steps и time_limit
+        действуют как в run. progress(step, index, total) вызывается после
+        каждого отрезка. Отмена задачи (Task.cancel) останавливает машину между
+        отрезками в согласованном состоянии (его можно сохранить снимком).
+        Возвращает число выполненных шагов.
+        """
+        self.halted = False
+        self.step = 0
+        deadline = time.perf_counter() + self.time_limit if self.time_limit is not None else None
+        while not self.halted:
+            self.step_n(min(budget_per_slice, self.max_steps + 1 - self.step))
+            if progress is not None:
+                progress(self.step, self.pc_index(), len(self.decoded))
+            if self._budget_exceeded(deadline):
+                break
+            await asyncio.sleep(0)
+        return self.step
+
+    def dump_memory(self, output_file, start_addr=0, end_addr=None, fmt="json", mode="full", baseline=None):
+        """
+        Сохраняет дамп памяти в файл (JSON, raw или sparse, см. memdump.py).
+        В режиме diff сохраняются только ячейки, отличающиеся от исходного
+        образа памяти или от дампа baseline (требует track_writes).
+        """
         if end_addr is None:
             end_addr = len(self.memory)
         end_addr = min(end_addr, len(self.memory))
 
-        # Формат дампа: список значений
-        dump_data = self.memory[start_addr:end_addr]
-
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(dump_data, f, indent=2)
+        if mode == "diff":
+            changed = write_diff(output_file, self.memory, start_addr, end_addr, fmt, baseline)
+            print(f"Дамп изменений (адреса {start_addr}-{end_addr - 1}, ячеек {changed}) сохранен в {output_file}")
+            return
+        write_dump(output_file, self.memory, start_addr, end_addr, fmt)
         print(f"Дамп памяти (адреса {start_addr}-{end_addr - 1}) сохранен в {output_file}")
 
+    def compare_memory(self, dump, limit=None):
+        """Расхождения памяти с дампом: тройки (адрес, значение, ожидаемое), см. memdump.find_mismatches."""
+        if dump.end > len(self.memory):
+            raise ValueError(f"Дамп выходит за размер памяти ({dump.end} > {len(self.memory)})")
+        return find_mismatches(self.memory, dump, limit)
+
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Интерпретатор УВМ (вариант 24) - Использует мнемоники')
-    parser.add_argument('--input', required=True, help='Входной бинарный файл')
-    parser.add_argument('--output', required=True, help='Выходной файл дампа памяти (JSON)')
+    parser.add_argument('--input', required=True, help='Входной бинарный файл (.bin или объектный файл uvmo)')
+    parser.add_argument('--output', required=True, help='Выходной файл дампа памяти')
+    parser.add_argument('--verify', action='store_true',
+                        help='Проверить контрольную сумму объектного файла (индекс, операнды, код) перед исполнением')
     parser.add_argument('--range', type=str, help='Диапазон адресов памяти для дампа (например, "0-100")')
-    parser.add_argument('--trace', action='store_true', help='Включить трассировку выполнения')
-
-    args = parser.parse_args()
-
-    interp = Interpreter()
+    parser.add_argument('--dump-format', choices=DUMP_FORMATS, default='json',
+                        help='Формат дампа: json - список значений, raw - бинарный образ, '
+                             'sparse - только ненулевые ячейки')
+    parser.add_argument('--dump-mode', choices=DUMP_MODES, default='full',
+                        help='full - все ячейки диапазона, diff - только изменённые ячейки (форматы json и sparse)')
+    parser.add_argument('--baseline', help='Эталонный дамп для --dump-mode diff (по умолчанию - исходный образ памяти)')
+    parser.add_argument('--compare', help='Сравнить память с эталонным дампом и вывести расхождения')
+    trace_group = parser.add_mutually_exclusive_group()
+    trace_group.add_argument('--trace', action='store_true', help='Включить трассировку выполнения')
+    trace_group.add_argument('--trace-file', help='Записать бинарную трассировку в файл (см. trace_dump.py)')
+    parser.add_argument('--trace-ring', type=int,
+                        help='Хранить в трассировке только последние N шагов (вместе с --trace-file)')
+    parser.add_argument('--profile', help='Сохранить профиль исполнения в JSON-файл')
+    parser.add_argument('--profile-sample', type=int, default=1,
+                        help='Учитывать в профиле каждый N-й шаг (ограничивает накладные расходы)')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='classic',
+                        help='Движок исполнения (трассировка и профилирование всегда выполняются движком classic; '
+                             'объектный файл uvmo загружается за постоянное время только движком classic, '
+                             'остальные декодируют его целиком при загрузке)')
+    parser.add_argument('--fusion-report', action='store_true',
+                        help='Вывести отчёт о слитых командах (движок fused)')
+    parser.add_argument('--memory', choices=sorted(MEMORY_BACKENDS), default='list',
+                        help='Тип памяти: list - совместимый список, u32/s32/bytes - 32-битные слова, '
+                             'paged - разреженная страничная память')
+    parser.add_argument('--memory-size', type=int, default=65536,
+                        help='Размер памяти в словах (для больших значений используйте --memory paged)')
+    parser.add_argument('--max-steps', type=int, default=10000, help='Лимит шагов исполнения')
+    parser.add_argument('--time-limit', type=float, help='Лимит времени исполнения в секундах')
+    parser.add_argument('--resume', help='Продолжить исполнение со снимка состояния (файл --save-snapshot)')
+    parser.add_argument('--save-snapshot',
+                        help='Сохранить снимок состояния после исполнения в файл (снимок копирует всю память; '
+                             'для --memory paged - только выделенные страницы)')
+
+    args = parser.parse_args(argv)
+    if args.trace_ring is not None and not args.trace_file:
+        parser.error("--trace-ring используется только вместе с --trace-file")
+    if args.dump_mode == 'diff' and args.dump_format == 'raw':
+        parser.error("--dump-mode diff поддерживает только форматы json и sparse")
+    if args.baseline and args.dump_mode != 'diff':
+        parser.error("--baseline используется только с --dump-mode diff")
+
+    interp = Interpreter(memory_size=args.memory_size, engine=args.engine, memory=args.memory,
+                         max_steps=args.max_steps, time_limit=args.time_limit,
+                         track_writes=args.dump_mode == 'diff' or bool(args.compare))
 
     try:
-        interp.load_program(args.input)
-        interp.run(trace=args.trace)
+        interp.load_program(args.input, verify=args.verify)
+        if args.resume:
+            interp.restore(VMSnapshot.load(args.resume))
+            print(f"Состояние восстановлено из {args.resume} (PC={interp.pc})", file=sys.stderr)
+        tracer = None
+        if args.trace_file and args.trace_ring:
+            tracer = TraceRing(args.trace_ring)
+        elif args.trace_file:
+            tracer = TraceFile(args.trace_file)
+        profile = ExecutionProfile(sample_every=args.profile_sample) if args.profile else None
+        try:
+            interp.run(trace=args.trace, tracer=tracer, profile=profile)
+        finally:
+            if isinstance(tracer, TraceRing):
+                tracer.save(args.trace_file)
+            elif tracer is not None:
+                tracer.close()
+        if args.fusion_report and isinstance(interp._engine, FusedEngine):
+            for name, counts in interp._engine.report().items():
+                print(f"Слияние {name}: мест {counts['sites']}, срабатываний {counts['fired']}", file=sys.stderr)
+        if profile:
+            profile.save(args.profile)
+            print(f"Профиль исполнения сохранен в {args.profile}", file=sys.stderr)
+        if args.save_snapshot:
+            interp.snapshot().save(args.save_snapshot)
+            print(f"Снимок состояния сохранен в {args.save_snapshot}", file=sys.stderr)
 
         start_addr, end_addr = 0, None
         if args.range:
@@ -223,7 +571,24 @@ def main():
                 print(f"Неверный формат диапазона: {args.range}. Ожидается 'start-end'.", file=sys.stderr)
                 return
 
-        interp.dump_memory(args.output, start_addr, end_addr)
+        baseline = load_dump(args.baseline) if args.baseline else None
+        try:
+            interp.dump_memory(args.output, start_addr, end_addr, args.dump_format, args.dump_mode, baseline)
+        finally:
+            if baseline is not None:
+                baseline.close()
+
+        if args.compare:
+            with load_dump(args.compare) as golden:
+                mismatches = interp.compare_memory(golden)
+            for address, actual, expected in mismatches[:COMPARE_REPORT_LIMIT]:
+                print(f"Расхождение M[{address}] = {actual}, ожидается {expected}", file=sys.stderr)
+            if len(mismatches) > COMPARE_REPORT_LIMIT:
+                print(f"... и ещё {len(mismatches) - COMPARE_REPORT_LIMIT}", file=sys.stderr)
+            if mismatches:
+                print(f"Память не совпадает с {args.compare}: расхождений {len(mismatches)}", file=sys.stderr)
+                sys.exit(1)
+            print(f"Память совпадает с {args.compare}", file=sys.stderr)
 
     except FileNotFoundError:
         print(f"Ошибка: Файл {args.input} не найден.", file=sys.stderr)
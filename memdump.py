@@ -0,0 +1,206 @@
+# memdump.py: Форматы дампа памяти УВМ и их загрузка
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+from memory import WriteTracking, array_typecode, to_little_endian
+
+DUMP_FORMATS = ("json", "raw", "sparse")
+# full - все ячейки диапазона; diff - только ячейки, отличающиеся от эталона (json или sparse)
+DUMP_MODES = ("full", "diff")
+
+# Заголовок бинарных дампов (32 байта, little-endian):
+# сигнатура, версия, вид (raw/sparse/diff), формат ячейки (struct: i, I или q),
+# начальный адрес, длина диапазона в ячейках, число записей в теле.
+HEADER = struct.Struct("<4sHBcQQQ")
+MAGIC = b"UVMD"
+VERSION = 1
+KIND_RAW = 1
+KIND_SPARSE = 2
+KIND_DIFF = 3  # Тело как у sparse: ячейки, отличающиеся от эталона
+
+
+def _pack_values(memory, values):
+    """Упаковывает значения ячеек в array формата памяти."""
+    try:
+        return array(array_typecode(memory.cell_format), values)
+    except OverflowError:
+        raise ValueError(f"Значение не помещается в ячейку формата '{memory.cell_format}'") from None
+
+
+def write_dump(output_file, memory, start_addr, end_addr, fmt="json"):
+    """Сохраняет ячейки [start_addr, end_addr) в файл в формате json, raw или sparse."""
+    if fmt == "json":
+        # Формат дампа: список значений
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(memory.read_range(start_addr, end_addr), f, indent=2)
+        return
+
+    length = max(0, end_addr - start_addr)
+    cell = memory.cell_format.encode()
+    with open(output_file, 'wb') as f:
+        if fmt == "raw":
+            f.write(HEADER.pack(MAGIC, VERSION, KIND_RAW, cell, start_addr, length, length))
+            cells = getattr(memory, "cells", None)
+            if cells is not None and sys.byteorder == "little":
+                # Типизированная память пишется без копирования
+                f.write(memoryview(cells)[start_addr:end_addr])
+            else:
+                f.write(to_little_endian(_pack_values(memory, memory.read_range(start_addr, end_addr))))
+        elif fmt == "sparse":
+            _write_items(f, KIND_SPARSE, memory, start_addr, length, memory.nonzero_items(start_addr, end_addr))
+        else:
+            raise ValueError(f"Неизвестный формат дампа: {fmt}")
+
+
+def _write_items(f, kind, memory, start_addr, length, items):
+    """Заголовок и тело дампа из пар (адрес, значение): массив адресов (u64), затем массив значений."""
+    f.write(HEADER.pack(MAGIC, VERSION, kind, memory.cell_format.encode(), start_addr, length, len(items)))
+    f.write(to_little_endian(array("Q", [address for address, _ in items])))
+    f.write(to_little_endian(_pack_values(memory, [value for _, value in items])))
+
+
+def changed_items(memory, start_addr, end_addr, baseline=None):
+    """
+    Пары (адрес, значение) ячеек [start_addr, end_addr), отличающихся от эталона:
+    исходного образа памяти или дампа baseline (MemoryDump; ячейки вне дампа
+    sparse/diff считаются нулевыми). Память должна отслеживать записи
+    (memory.enable_write_tracking). С дампом сравниваются записанные ячейки,
+    ячейки дампа и ненулевые ячейки исходного образа - остальные равны нулю
+    и в памяти, и в эталоне. Время пропорционально их числу, а не размеру памяти.
+    """
+    if not isinstance(memory, WriteTracking):
+        raise ValueError("Дамп изменений требует памяти с отслеживанием записей")
+    if baseline is None:
+        return memory.changed_items(start_addr, end_addr)
+    expected = dict(baseline.nonzero_items())
+    addresses = set(memory.written_addresses(start_addr, end_addr))
+    addresses.update(address for address in expected if start_addr <= address < end_addr)
+    addresses.update(address for address in memory.initial_nonzero if start_addr <= address < end_addr)
+    return [(address, memory[address]) for address in sorted(addresses)
+            if memory[address] != expected.get(address, 0)]
+
+
+def write_diff(output_file, memory, start_addr, end_addr, fmt="sparse", baseline=None):
+    """
+    Сохраняет только ячейки [start_addr, end_addr), отличающиеся от эталона
+    (см. changed_items): в формате json - объект {"start", "length", "changes"},
+    в формате sparse - бинарный дамп вида diff.
+    """
+    items = changed_items(memory, start_addr, end_addr, baseline)
+    length = max(0, end_addr - start_addr)
+    if fmt == "json":
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump({"start": start_addr, "length": length, "changes": items}, f)
+    elif fmt == "sparse":
+        with open(output_file, 'wb') as f:
+            _write_items(f, KIND_DIFF, memory, start_addr, length, items)
+    else:
+        raise ValueError(f"Дамп изменений не поддерживает формат {fmt}")
+    return len(items)
+
+
+def find_mismatches(memory, dump, limit=None):
+    """
+    Сравнивает память с дампом; возвращает до limit троек (адрес, значение,
+    ожидаемое) по возрастанию адреса. Для дампов sparse/diff и памяти с
+    отслеживанием записей сравниваются только записанные ячейки, ячейки дампа
+    и ненулевые ячейки исходного образа (ячейки вне дампа ожидаются нулевыми);
+    иначе - весь диапазон дампа.
+    """
+    if isinstance(memory, WriteTracking) and dump.items is not None:
+        actual = changed_items(memory, dump.start, dump.end, dump)
+        expected = dict(dump.items)
+        mismatches = [(address, value, expected.get(address, 0)) for address, value in actual]
+    else:
+        actual = memory.read_range(dump.start, dump.end)
+        mismatches = [(dump.start + offset, a, e) for offset, (a, e) in enumerate(zip(actual, dump.values()))
+                      if a != e]
+    return mismatches[:limit] if limit is not None else mismatches
+
+
+class MemoryDump:
+    """
+    Загруженный дамп памяти. Для формата raw значения доступны через
+    cells - memoryview поверх mmap файла без копирования. Дамп diff хранит
+    только изменённые ячейки (items); values() дополняет их нулями, что верно
+    для изменений относительно нулевой памяти.
+    """
+
+    def __init__(self, fmt, start, length, cells=None, items=None, mapping=None):
+        self.format = fmt
+        self.start = start
+        self.length = length
+        self.cells = cells  # Плотные значения (raw, json)
+        self.items = items  # Пары (адрес, значение) (sparse, diff)
+        self._mapping = mapping
+
+    @property
+    def end(self):
+        return self.start + self.length
+
+    def values(self):
+        """Значения всех ячеек диапазона списком."""
+        if self.cells is not None:
+            return self.cells.tolist() if isinstance(self.cells, memoryview) else list(self.cells)
+        values = [0] * self.length
+        for address, value in self.items:
+            values[address - self.start] = value
+        return values
+
+    def nonzero_items(self):
+        """Пары (адрес, значение) ненулевых ячеек."""
+        if self.items is not None:
+            return list(self.items)
+        return [(self.start + i, value) for i, value in enumerate(self.cells) if value]
+
+    def close(self):
+        """Освобождает отображение файла в память."""
+        if self._mapping is not None:
+            self.cells.release()
+            self._mapping.close()
+            self._mapping = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_dump(input_file, start_addr=0):
+    """
+    Загружает дамп любого формата. Формат определяется по сигнатуре; JSON-дамп
+    не хранит начальный адрес, он задаётся параметром start_addr.
+    """
+    with open(input_file, 'rb') as f:
+        head = f.read(HEADER.size)
+        if not head.startswith(MAGIC):
+            f.seek(0)
+            values = json.loads(f.read().decode('utf-8'))
+            if isinstance(values, dict):
+                items = [tuple(item) for item in values["changes"]]
+                return MemoryDump("diff", values["start"], values["length"], items=items)
+            return MemoryDump("json", start_addr, len(values), cells=values)
+
+        magic, version, kind, cell, start, length, entries = HEADER.unpack(head)
+        if version != VERSION:
+            raise ValueError(f"Неподдерживаемая версия дампа: {version}")
+        code = array_typecode(cell.decode())
+        if kind == KIND_RAW:
+            if entries and sys.byteorder == "little":
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                cells = memoryview(mapping)[HEADER.size:].cast(code)
+                return MemoryDump("raw", start, length, cells=cells, mapping=mapping)
+            cells = array(code)
+            cells.frombytes(f.read())
+            return MemoryDump("raw", start, length, cells=to_little_endian(cells))
+        if kind in (KIND_SPARSE, KIND_DIFF):
+            addresses, values = array("Q"), array(code)
+            addresses.frombytes(f.read(entries * addresses.itemsize))
+            values.frombytes(f.read(entries * values.itemsize))
+            items = list(zip(to_little_endian(addresses), to_little_endian(values)))
+            return MemoryDump("sparse" if kind == KIND_SPARSE else "diff", start, length, items=items)
+        raise ValueError(f"Неизвестный вид дампа: {kind}")
@@ -0,0 +1,426 @@
+# memory.py: Реализации памяти УВМ
+
+import sys
+from array import array
+
+WORD_MASK = 0xFFFFFFFF  # Машинное слово УВМ - 32 бита
+PAGE_BITS = 12  # Страница (PagedMemory и снимки): 4096 ячеек
+PAGE_SIZE = 1 << PAGE_BITS
+
+
+def wrap_u32(value):
+    """Приведение к 32-битному беззнаковому слову (как маска в SHIFT_RIGHT)."""
+    return value & WORD_MASK
+
+
+def wrap_s32(value):
+    """Приведение к 32-битному слову в дополнительном коде."""
+    return ((value + 0x80000000) & WORD_MASK) - 0x80000000
+
+
+def _nonzero(values, start):
+    """Пары (адрес, значение) для ненулевых ячеек последовательности."""
+    return [(start + i, value) for i, value in enumerate(values) if value]
+
+
+def _typecode(signed):
+    """Код типа array с 4-байтовыми элементами для текущей платформы."""
+    for code in ("i", "l") if signed else ("I", "L"):
+        if array(code).itemsize == 4:
+            return code
+    raise RuntimeError("Платформа не поддерживает 32-битные массивы")
+
+
+def array_typecode(cell_format):
+    """Код типа array для формата ячейки дампа ("i", "I" - 32 бита, "q" - 64 бита)."""
+    if cell_format == "q":
+        return "q"
+    return _typecode(cell_format == "i")
+
+
+def to_little_endian(values):
+    """Переводит array в порядок байт little-endian (на big-endian платформах)."""
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+class ListMemory(list):
+    """
+    Совместимая память: список целых Python. Значения не усекаются,
+    поведение совпадает с исходной реализацией интерпретатора.
+    """
+    name = "list"
+    cell_format = "q"  # Формат ячейки в бинарном дампе (struct)
+
+    def __init__(self, size):
+        super().__init__([0] * size)
+
+    def clone(self):
+        """Независимая копия памяти (полное копирование)."""
+        other = ListMemory.__new__(ListMemory)
+        list.__init__(other, self)
+        return other
+
+    def read_page(self, number):
+        """Копия ячеек страницы number (для снимков)."""
+        start = number << PAGE_BITS
+        return list.__getitem__(self, slice(start, start + PAGE_SIZE))
+
+    def write_page(self, number, cells):
+        """Записывает ячейки страницы number без отслеживания записей."""
+        start = number << PAGE_BITS
+        list.__setitem__(self, slice(start, start + len(cells)), cells)
+
+    def read_range(self, start, end):
+        """Возвращает значения ячеек [start, end) списком."""
+        return self[start:end]
+
+    def nonzero_items(self, start, end):
+        """Пары (адрес, значение) ненулевых ячеек в [start, end)."""
+        return _nonzero(self[start:end], start)
+
+
+class ArrayMemory:
+    """
+    Память на основе array: 4 байта на ячейку вместо указателя на объект int.
+    Записываемые значения приводятся к 32-битному слову: в беззнаковом режиме
+    берутся младшие 32 бита, в знаковом - они же в дополнительном коде.
+    """
+    name = "u32"
+    cell_format = "I"
+    signed = False
+
+    def __init__(self, size):
+        self.cells = array(_typecode(self.signed), [0]) * size
+        self.wrap = wrap_s32 if self.signed else wrap_u32
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __getitem__(self, address):
+        return self.cells[address]
+
+    def clone(self):
+        """Независимая копия памяти (полное копирование)."""
+        cls = MEMORY_BACKENDS[self.name]  # Без примесей отслеживания
+        other = cls.__new__(cls)
+        other.cells = array(self.cells.typecode, self.cells)
+        other.wrap = self.wrap
+        return other
+
+    def __setitem__(self, address, value):
+        self.cells[address] = self.wrap(value)
+
+    def read_page(self, number):
+        """Копия ячеек страницы number (для снимков)."""
+        start = number << PAGE_BITS
+        return self.cells[start:start + PAGE_SIZE]
+
+    def write_page(self, number, cells):
+        """Записывает ячейки страницы number без отслеживания записей."""
+        start = number << PAGE_BITS
+        self.cells[start:start + len(cells)] = cells
+
+    def read_range(self, start, end):
+        """Возвращает значения ячеек [start, end) списком."""
+        return self.cells[start:end].tolist()
+
+    def nonzero_items(self, start, end):
+        """Пары (адрес, значение) ненулевых ячеек в [start, end)."""
+        return _nonzero(self.cells[start:end], start)
+
+
+class SignedArrayMemory(ArrayMemory):
+    """32-битная память со знаковыми значениями."""
+    name = "s32"
+    cell_format = "i"
+    signed = True
+
+
+class BufferMemory(ArrayMemory):
+    """
+    Память поверх bytearray: беззнаковые 32-битные слова, доступные как
+    непрерывный буфер байтов (self.buffer) без копирования.
+    """
+    name = "bytes"
+
+    def __init__(self, size):
+        self.buffer = bytearray(4 * size)
+        self.cells = memoryview(self.buffer).cast(_typecode(False))
+        self.wrap = wrap_u32
+
+    def clone(self):
+        """Независимая копия памяти (полное копирование буфера)."""
+        other = BufferMemory.__new__(BufferMemory)
+        other.buffer = bytearray(self.buffer)
+        other.cells = memoryview(other.buffer).cast(_typecode(False))
+        other.wrap = wrap_u32
+        return other
+
+    def read_page(self, number):
+        """Копия ячеек страницы number (срез memoryview не копирует - копируем в array)."""
+        start = 4 * (number << PAGE_BITS)
+        return array(self.cells.format, self.buffer[start:start + 4 * PAGE_SIZE])
+
+
+class PagedMemory:
+    """
+    Разреженная страничная память для больших адресных пространств.
+    Страница из PAGE_SIZE 32-битных беззнаковых слов выделяется при первой
+    записи в неё, чтение невыделенной страницы возвращает 0. Затраты памяти
+    и времени создания не зависят от номинального размера.
+
+    Копии (clone) разделяют страницы по принципу копирования при записи:
+    страница копируется только при первой записи в неё после clone, поэтому
+    копирование данных пропорционально числу изменённых страниц.
+    """
+    name = "paged"
+    cell_format = "I"
+    PAGE_BITS = PAGE_BITS
+    PAGE_SIZE = PAGE_SIZE
+    PAGE_MASK = PAGE_SIZE - 1
+
+    def __init__(self, size):
+        self.size = size
+        self.pages = {}  # Номер страницы -> array слов
+        self.owned = set()  # Страницы, не разделяемые с копиями (можно писать на месте)
+        self.typecode = _typecode(False)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, address):
+        page = self.pages.get(address >> self.PAGE_BITS)
+        if page is None:
+            return 0
+        return page[address & self.PAGE_MASK]
+
+    def __setitem__(self, address, value):
+        number = address >> self.PAGE_BITS
+        if number in self.owned:
+            page = self.pages[number]
+        else:
+            page = self.pages.get(number)
+            if page is None:
+                page = array(self.typecode, [0]) * self.PAGE_SIZE
+            else:
+                page = array(self.typecode, page)  # Разделяемая страница: копия при записи
+            self.pages[number] = page
+            self.owned.add(number)
+        page[address & self.PAGE_MASK] = value & WORD_MASK
+
+    def clone(self):
+        """
+        Копия, разделяющая с исходной памятью все страницы до первой записи.
+        Копируется словарь ссылок на страницы: O(выделенных страниц), а не
+        O(изменённых с прошлой копии).
+        """
+        other = PagedMemory.__new__(PagedMemory)
+        other.size = self.size
+        other.pages = dict(self.pages)
+        other.owned = set()
+        other.typecode = self.typecode
+        self.owned = set()
+        return other
+
+    def allocated_pages(self, start=0, end=None):
+        """Номера выделенных страниц, пересекающихся с [start, end), по возрастанию."""
+        if end is None:
+            end = self.size
+        first, last = start >> self.PAGE_BITS, (end - 1) >> self.PAGE_BITS
+        return sorted(number for number in self.pages if first <= number <= last)
+
+    def read_range(self, start, end):
+        """Возвращает значения ячеек [start, end) списком, обходя только выделенные страницы."""
+        result = [0] * max(0, end - start)
+        for number in self.allocated_pages(start, end):
+            page_start = number << self.PAGE_BITS
+            lo, hi = max(start, page_start), min(end, page_start + self.PAGE_SIZE)
+            result[lo - start:hi - start] = self.pages[number][lo - page_start:hi - page_start].tolist()
+        return result
+
+    def nonzero_items(self, start, end):
+        """Пары (адрес, значение) ненулевых ячеек в [start, end) по выделенным страницам."""
+        items = []
+        for number in self.allocated_pages(start, end):
+            page_start = number << self.PAGE_BITS
+            lo, hi = max(start, page_start), min(end, page_start + self.PAGE_SIZE)
+            items.extend(_nonzero(self.pages[number][lo - page_start:hi - page_start], lo))
+        return items
+
+
+class WriteTracking:
+    """
+    Примесь к типу памяти, отслеживающая записи (см. enable_write_tracking):
+    при первой записи в ячейку запоминается её прежнее значение. Записанные
+    адреса, их интервалы и изменённые ячейки находятся за время,
+    пропорциональное числу записанных адресов, а не размеру памяти.
+    """
+
+    def __setitem__(self, address, value):
+        original = self.original
+        if address not in original:
+            original[address] = self[address]
+        super().__setitem__(address, value)
+
+    def reset_tracking(self, zeroed=False):
+        """
+        Текущее содержимое становится исходным образом. Запоминаются адреса его
+        ненулевых ячеек (zeroed=True - память заведомо нулевая, без просмотра):
+        незаписанные ячейки, отличающиеся от нулевого эталона, находятся по ним.
+        """
+        self.original = {}
+        self.initial_nonzero = [] if zeroed else [address for address, _ in self.nonzero_items(0, len(self))]
+
+    def written_addresses(self, start=0, end=None):
+        """Записанные адреса в [start, end) по возрастанию."""
+        if end is None:
+            end = len(self)
+        return sorted(address for address in self.original if start <= address < end)
+
+    def dirty_ranges(self, start=0, end=None):
+        """Записанные адреса, слитые в интервалы (начало, конец) по возрастанию."""
+        ranges = []
+        for address in self.written_addresses(start, end):
+            if ranges and ranges[-1][1] == address:
+                ranges[-1][1] = address + 1
+            else:
+                ranges.append([address, address + 1])
+        return [tuple(interval) for interval in ranges]
+
+    def changed_items(self, start=0, end=None):
+        """Пары (адрес, значение) ячеек в [start, end), отличающихся от исходного образа."""
+        original = self.original
+        return [(address, self[address]) for address in self.written_addresses(start, end)
+                if self[address] != original[address]]
+
+
+_MIXED_TYPES = {}  # (примесь, тип памяти) -> тип памяти с примесью
+
+
+def _add_mixin(memory, mixin, prefix):
+    """
+    Подмешивает mixin к типу памяти на месте: объект остаётся тем же, поэтому
+    примесь можно добавить и после того, как движки захватили память.
+    """
+    base = type(memory)
+    mixed = _MIXED_TYPES.get((mixin, base))
+    if mixed is None:
+        mixed = _MIXED_TYPES[(mixin, base)] = type(f"{prefix}{base.__name__}", (mixin, base), {})
+    memory.__class__ = mixed
+
+
+def enable_write_tracking(memory, zeroed=False):
+    """
+    Включает отслеживание записей для памяти на месте и сбрасывает исходный
+    образ (см. WriteTracking.reset_tracking). Возвращает memory.
+    """
+    if not isinstance(memory, WriteTracking):
+        _add_mixin(memory, WriteTracking, "Tracked")
+    memory.reset_tracking(zeroed)
+    return memory
+
+
+class PageImage:
+    """
+    Неизменяемый постраничный образ плоской памяти (list, u32, s32, bytes)
+    для снимков: номер страницы -> копия её ячеек. Образы, снятые с одной
+    памяти, разделяют страницы, не записанные между снимками.
+    """
+
+    def __init__(self, name, size, pages):
+        self.name = name
+        self.size = size
+        self.pages = pages
+
+    def __len__(self):
+        return self.size
+
+    def nonzero_items(self, start, end):
+        """Пары (адрес, значение) ненулевых ячеек в [start, end)."""
+        items = []
+        for number in range(start >> PAGE_BITS, ((end - 1) >> PAGE_BITS) + 1 if end > start else 0):
+            page_start = number << PAGE_BITS
+            lo, hi = max(start, page_start), min(end, page_start + PAGE_SIZE)
+            items.extend(_nonzero(self.pages[number][lo - page_start:hi - page_start], lo))
+        return items
+
+
+class PageTracking:
+    """
+    Примесь к плоскому типу памяти (см. capture_image): номера страниц,
+    записанных после последнего снимка или восстановления, и образ, с которым
+    совпадают остальные страницы. Добавляет к каждой записи одну вставку в set.
+    """
+
+    def __setitem__(self, address, value):
+        self.dirty_pages.add(address >> PAGE_BITS)
+        super().__setitem__(address, value)
+
+
+def capture_image(memory):
+    """
+    Образ памяти для снимка. Страничная память копируется через clone (страницы
+    разделяются до первой записи). Плоская память при первом снимке получает
+    отслеживание записанных страниц (PageTracking) и копируется целиком, далее
+    копируются только страницы, записанные после прошлого снимка или
+    восстановления: O(записанных страниц) копирования ячеек плюс копия словаря
+    ссылок на страницы (len(memory) / PAGE_SIZE элементов).
+    """
+    if isinstance(memory, PagedMemory):
+        return memory.clone()
+    if isinstance(memory, PageTracking):
+        pages = dict(memory.image.pages)
+        dirty = memory.dirty_pages
+    else:
+        _add_mixin(memory, PageTracking, "PageTracked")
+        pages = {}
+        dirty = range((len(memory) + PAGE_SIZE - 1) >> PAGE_BITS)
+    for number in dirty:
+        pages[number] = memory.read_page(number)
+    memory.image = PageImage(memory.name, len(memory), pages)
+    memory.dirty_pages = set()
+    return memory.image
+
+
+def restore_image(memory, image):
+    """
+    Возвращает память к образу capture_image на месте (тип и размер должны
+    совпадать). Плоская память переписывает только страницы, записанные после
+    последнего снимка или восстановления, и страницы, которыми образ отличается
+    от образа памяти; страничная - копирует словарь ссылок на страницы образа.
+    """
+    if isinstance(memory, PagedMemory):
+        memory.pages = dict(image.pages)
+        memory.owned = set()
+        return memory
+    if isinstance(memory, PageTracking):
+        current = memory.image.pages
+        changed = set(memory.dirty_pages)
+        changed.update(number for number, page in image.pages.items() if current.get(number) is not page)
+    else:
+        _add_mixin(memory, PageTracking, "PageTracked")
+        changed = image.pages
+    for number in changed:
+        memory.write_page(number, image.pages[number])
+    memory.image = image
+    memory.dirty_pages = set()
+    return memory
+
+
+MEMORY_BACKENDS = {
+    ListMemory.name: ListMemory,
+    ArrayMemory.name: ArrayMemory,
+    SignedArrayMemory.name: SignedArrayMemory,
+    BufferMemory.name: BufferMemory,
+    PagedMemory.name: PagedMemory,
+}
+
+
+def create_memory(kind, size):
+    """Создаёт память выбранного типа."""
+    if kind not in MEMORY_BACKENDS:
+        raise ValueError(f"Неизвестный тип памяти: {kind}")
+    return MEMORY_BACKENDS[kind](size)
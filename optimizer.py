@@ -0,0 +1,169 @@
+# optimizer.py: Оптимизатор промежуточного представления ассемблера УВМ (-O)
+
+from uvmspec import UVMSpec24
+
+REGISTER_COUNT = 8
+
+
+def effective_fields(cmd):
+    """Значения полей так, как их увидит интерпретатор: усечение по ширине и знаковое расширение."""
+    opcode = cmd["A"]
+    fields = {}
+    for name, start_bit, end_bit in UVMSpec24.FIELDS[opcode][1:]:
+        width = end_bit - start_bit + 1
+        value = cmd[name] & ((1 << width) - 1)
+        if name in UVMSpec24.SIGNED_FIELDS.get(opcode, ()):
+            value = UVMSpec24.sign_extend(value, width)
+        fields[name] = value
+    return fields
+
+
+class OptimizationReport:
+    """Сколько команд и байт удалил оптимизатор, по видам преобразований."""
+
+    def __init__(self):
+        self.removed = {"redundant_load": 0, "dead_load": 0, "dead_store": 0}
+        self.bytes_removed = 0
+
+    @property
+    def instructions_removed(self):
+        return sum(self.removed.values())
+
+    def __str__(self):
+        details = ", ".join(f"{kind}: {count}" for kind, count in self.removed.items())
+        return f"Оптимизация: удалено команд {self.instructions_removed}, байт {self.bytes_removed} ({details})"
+
+
+class PeepholeOptimizer:
+    """
+    Удаление избыточных команд в прямолинейной программе:
+    - LOAD_CONST значения, которое уже находится в регистре;
+    - LOAD_CONST, результат которого перезаписывается до чтения;
+    - WRITE_MEM и SHIFT_RIGHT в ячейку, которая перезаписывается до чтения.
+
+    Значения регистров отслеживаются по константам LOAD_CONST; содержимое
+    памяти считается неизвестным. Результат исполнения (память, ошибки
+    доступа, предупреждения) не меняется при размере памяти не меньше
+    memory_size, если исходная программа укладывается в лимит шагов.
+    Запись удаляется, только если её адрес и адрес перезаписи известны
+    статически и между ними нет команд, способных остановить исполнение.
+    """
+
+    def __init__(self, memory_size=65536):
+        self.memory_size = memory_size
+
+    def optimize(self, commands):
+        """Возвращает оптимизированный список команд и OptimizationReport."""
+        report = OptimizationReport()
+        commands = list(commands)
+        decoded = [effective_fields(cmd) for cmd in commands]
+        while True:
+            removed = set()
+            removed |= self._redundant_loads(commands, decoded, report)
+            removed |= self._dead_loads(commands, decoded, removed, report)
+            if not removed:
+                removed |= self._dead_stores(commands, decoded, report)
+            if not removed:
+                break
+            for index in removed:
+                report.bytes_removed += UVMSpec24.CMD_SIZES[commands[index]["A"]]
+            commands = [cmd for i, cmd in enumerate(commands) if i not in removed]
+            decoded = [fields for i, fields in enumerate(decoded) if i not in removed]
+        return commands, report
+
+    def _in_bounds(self, address):
+        return address is not None and 0 <= address < self.memory_size
+
+    def _analyze(self, commands, decoded):
+        """
+        Прямой проход с известными значениями регистров. Для каждой команды:
+        (адрес чтения, адрес записи, может ли остановить исполнение,
+        можно ли удалить запись без изменения вывода).
+        """
+        known = [0] * REGISTER_COUNT  # Регистры в начале исполнения равны 0
+        result = []
+        for cmd, fields in zip(commands, decoded):
+            opcode = cmd["A"]
+            read_address = write_address = None
+            may_stop = removable = False
+            if opcode == UVMSpec24.OP_LOAD:
+                known[fields["B"]] = fields["C"]
+            elif opcode == UVMSpec24.OP_READ:
+                base = known[fields["D"]]
+                read_address = base + fields["B"] if base is not None else None
+                may_stop = not self._in_bounds(read_address)
+                known[fields["C"]] = None
+            elif opcode == UVMSpec24.OP_WRITE:
+                write_address = known[fields["C"]]
+                may_stop = not self._in_bounds(write_address)
+                removable = not may_stop
+            elif opcode == UVMSpec24.OP_SHIFT_RIGHT:
+                if fields["C"] >= REGISTER_COUNT:
+                    may_stop = True  # Номер регистра вне диапазона - исключение
+                else:
+                    write_address = known[fields["E"]]
+                    may_stop = not self._in_bounds(write_address)
+                    amount = known[fields["C"]]
+                    # Отрицательный сдвиг печатает предупреждение - такую команду не удаляем
+                    removable = not may_stop and amount is not None and amount + fields["D"] >= 0
+            result.append((read_address, write_address, may_stop, removable))
+        return result
+
+    def _redundant_loads(self, commands, decoded, report):
+        """LOAD_CONST значения, которое регистр уже содержит."""
+        removed = set()
+        known = [0] * REGISTER_COUNT
+        for index, (cmd, fields) in enumerate(zip(commands, decoded)):
+            opcode = cmd["A"]
+            if opcode == UVMSpec24.OP_LOAD:
+                if known[fields["B"]] == fields["C"]:
+                    removed.add(index)
+                    report.removed["redundant_load"] += 1
+                known[fields["B"]] = fields["C"]
+            elif opcode == UVMSpec24.OP_READ:
+                known[fields["C"]] = None
+        return removed
+
+    def _dead_loads(self, commands, decoded, skip, report):
+        """LOAD_CONST, значение которого перезаписывается до чтения (обратный проход)."""
+        removed = set()
+        live = set(range(REGISTER_COUNT))  # В конце программы все регистры считаются живыми
+        for index in range(len(commands) - 1, -1, -1):
+            if index in skip:
+                continue
+            opcode, fields = commands[index]["A"], decoded[index]
+            if opcode == UVMSpec24.OP_LOAD:
+                if fields["B"] not in live:
+                    removed.add(index)
+                    report.removed["dead_load"] += 1
+                live.discard(fields["B"])
+            elif opcode == UVMSpec24.OP_READ:
+                live.discard(fields["C"])
+                live.add(fields["D"])
+            elif opcode == UVMSpec24.OP_WRITE:
+                live.update((fields["B"], fields["C"]))
+            elif opcode == UVMSpec24.OP_SHIFT_RIGHT:
+                if fields["C"] < REGISTER_COUNT:
+                    live.update((fields["B"], fields["C"], fields["E"]))
+        return removed
+
+    def _dead_stores(self, commands, decoded, report):
+        """WRITE_MEM и SHIFT_RIGHT в ячейку, перезаписываемую до чтения."""
+        removed = set()
+        pending = {}  # Адрес -> индекс последней удаляемой записи, ещё не прочитанной
+        for index, (read_address, write_address, may_stop, removable) in enumerate(
+                self._analyze(commands, decoded)):
+            if may_stop:
+                # Если исполнение остановится здесь, более ранние записи останутся в памяти
+                pending.clear()
+                continue
+            if read_address is not None:
+                pending.pop(read_address, None)
+            if write_address is not None:
+                previous = pending.pop(write_address, None)
+                if previous is not None:
+                    removed.add(previous)
+                    report.removed["dead_store"] += 1
+                if removable:
+                    pending[write_address] = index
+        return removed
@@ -0,0 +1,97 @@
+# profiling.py: Профилирование исполнения УВМ
+
+import json
+import time
+from collections import Counter
+from uvmspec import UVMSpec24
+from tracing import TRACE_ABORTED, TRACE_DECODE_ERROR, TRACE_END, TRACE_FAULT
+
+
+class ExecutionProfile:
+    """
+    Статистика исполнения: число и суммарное время команд по кодам операций,
+    число выполнений по PC, обращения к памяти и тепловая карта адресов.
+
+    Подключается к интерпретатору как приёмник записей трассировки. При
+    sample_every=N полностью учитывается только каждый N-й шаг, остальные
+    стоят одного вызова функции; оценка полного числа - значение * N.
+    """
+    echoes_messages = False
+
+    def __init__(self, sample_every=1, bucket_size=256):
+        if sample_every <= 0 or bucket_size <= 0:
+            raise ValueError("Период выборки и размер корзины должны быть положительными")
+        self.sample_every = sample_every
+        self.bucket_size = bucket_size
+        self.opcode_counts = Counter()
+        self.opcode_time = Counter()  # Секунды по кодам операций
+        self.pc_hits = Counter()
+        self.memory_reads = 0
+        self.memory_writes = 0
+        self.heatmap = {}  # Номер корзины адресов -> [чтения, записи]
+        self.samples = 0
+        self.steps = 0
+        self._countdown = sample_every
+        self._last_time = time.perf_counter()
+
+    def record(self, step, pc, opcode, flags, b, c, d, e, address, value, operand, amount):
+        self._countdown -= 1
+        if self._countdown > 0:
+            if self._countdown == 1:
+                self._last_time = time.perf_counter()  # Начало следующего учитываемого шага
+            return
+        self._countdown = self.sample_every
+        now = time.perf_counter()
+        elapsed, self._last_time = now - self._last_time, now
+        if flags & (TRACE_END | TRACE_DECODE_ERROR | TRACE_ABORTED):
+            return
+
+        self.samples += 1
+        self.opcode_counts[opcode] += 1
+        self.opcode_time[opcode] += elapsed
+        self.pc_hits[pc] += 1
+        if flags & TRACE_FAULT or opcode == UVMSpec24.OP_LOAD:
+            return
+        bucket = self.heatmap.setdefault(address // self.bucket_size, [0, 0])
+        if opcode == UVMSpec24.OP_READ:
+            self.memory_reads += 1
+            bucket[0] += 1
+        else:
+            self.memory_writes += 1
+            bucket[1] += 1
+
+    def close(self):
+        pass
+
+    def hot_pcs(self, count=10):
+        """Наиболее часто выполняемые PC: список пар (pc, число выполнений)."""
+        return self.pc_hits.most_common(count)
+
+    def to_dict(self):
+        """Статистика в виде словаря, пригодного для JSON."""
+        mnemonic = UVMSpec24.OPCODE_TO_MNEMONIC
+        return {
+            "steps": self.steps,
+            "sample_every": self.sample_every,
+            "samples": self.samples,
+            "opcodes": {
+                mnemonic[op]: {"count": count, "time": self.opcode_time[op]}
+                for op, count in sorted(self.opcode_counts.items())
+            },
+            "pc_hits": {str(pc): hits for pc, hits in sorted(self.pc_hits.items())},
+            "hot_pcs": self.hot_pcs(),
+            "memory": {
+                "reads": self.memory_reads,
+                "writes": self.memory_writes,
+                "bucket_size": self.bucket_size,
+                "heatmap": {
+                    f"{n * self.bucket_size}-{(n + 1) * self.bucket_size - 1}": {"reads": r, "writes": w}
+                    for n, (r, w) in sorted(self.heatmap.items())
+                },
+            },
+        }
+
+    def save(self, path):
+        """Сохраняет статистику в JSON-файл."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
@@ -1,80 +1,237 @@
-import subprocess
-import sys
+import argparse
+import contextlib
+import io
 import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from assembler import Assembler
+from interpreter import ENGINES, Interpreter
+from memdump import DUMP_FORMATS, find_mismatches, load_dump
+from optimizer import PeepholeOptimizer
+
+# Параметры интерпретатора, задаваемые в комментариях в начале CSV теста ("# max_steps: 5")
+TEST_OPTIONS = {"max_steps": int}
+# Строки вывода с предупреждениями и ошибками шагов (см. tracing.event_messages)
+EVENT_PREFIXES = ("  ПРЕДУПРЕЖДЕНИЕ:", "  ОШИБКА:")
+
+
+def artifact_paths(test_csv_path):
+    """Имена файлов теста: бинарный код, журнал, эталонный и фактический дампы."""
+    base = os.path.splitext(test_csv_path)[0]
+    return {
+        "bin": f"{base}.bin",
+        "log": f"{base}_output.log",
+        "golden": f"{base}_memory_dump.mem",
+        "actual": f"{base}_memory_dump.actual.mem",
+    }
+
+
+def read_test_options(test_path):
+    """Параметры интерпретатора из начальных комментариев CSV теста (см. TEST_OPTIONS)."""
+    options = {}
+    if not test_path.endswith(".csv"):
+        return options
+    with open(test_path, encoding='utf-8-sig') as f:
+        for line in f:
+            if not line.startswith('#'):
+                break
+            key, sep, value = line[1:].partition(':')
+            if sep and key.strip() in TEST_OPTIONS:
+                options[key.strip()] = TEST_OPTIONS[key.strip()](value.strip())
+    return options
+
+
+def load_test_program(test_path, optimize=False):
+    """
+    Бинарный код теста: CSV ассемблируется (optimize=True - с оптимизатором -O),
+    бинарный тест (.bin) читается как есть.
+    """
+    if test_path.endswith(".bin"):
+        with open(test_path, 'rb') as f:
+            return f.read()
+    assembler = Assembler()
+    commands = assembler.parse_csv(test_path)
+    if optimize:
+        commands, _ = PeepholeOptimizer().optimize(commands)
+    return assembler.spec.encode_many(commands)
+
+
+def execute(binary_data, engine="classic", **options):
+    """
+    Исполняет программу движком engine в текущем процессе (с отслеживанием
+    записей). Возвращает интерпретатор и строки его вывода без строки скорости,
+    которая меняется от запуска к запуску.
+    """
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        interp = Interpreter(engine=engine, track_writes=True, **options)
+        interp.load_program_data(binary_data)
+        interp.run()
+    return interp, [line for line in output.getvalue().splitlines() if not line.startswith("Скорость:")]
+
+
+def compare_output(actual, expected):
+    """Первое расхождение вывода (предупреждений, ошибок, числа шагов) или None."""
+    for number, (line, expected_line) in enumerate(zip(actual, expected), 1):
+        if line != expected_line:
+            return f"строка {number} вывода: {line!r}, ожидается {expected_line!r}"
+    if len(actual) != len(expected):
+        return f"строк вывода {len(actual)}, ожидается {len(expected)}"
+    return None
 
-def run_test(assembler_path, interpreter_path, test_csv_path):
-    """Запускает один тест: ассемблирует и интерпретирует."""
-    print(f"--- Тестируем файл: {test_csv_path} ---")
 
-    # Генерируем имена файлов
-    base_name = os.path.splitext(os.path.basename(test_csv_path))[0]
-    binary_file = f"tests/{base_name}.bin"
-    output_log = f"tests/{base_name}_output.log"
-    memory_dump = f"tests/{base_name}_memory_dump.mem"
+def check_optimized(test_path, golden_path, output, options):
+    """
+    Исполняет тест, собранный с -O, и сравнивает его память с эталоном, а
+    предупреждения и ошибки шагов - с выводом исходной программы output.
+    Возвращает текст расхождения или None. Бинарные тесты и тесты с лимитом
+    шагов не проверяются: оптимизатор сохраняет результат, только если
+    программа укладывается в лимит шагов (см. PeepholeOptimizer).
+    """
+    if not test_path.endswith(".csv") or "max_steps" in options:
+        return None
+    interp, optimized_output = execute(load_test_program(test_path, optimize=True), **options)
+    mismatch = compare_with_golden(interp.memory, golden_path) or compare_output(
+        [line for line in optimized_output if line.startswith(EVENT_PREFIXES)],
+        [line for line in output if line.startswith(EVENT_PREFIXES)])
+    return f"-O: {mismatch}" if mismatch is not None else None
 
-    # 1. Ассемблирование
-    print("1. Ассемблирование...")
+
+def compare_with_golden(memory, golden_path):
+    """
+    Сравнивает память с эталонным дампом (любой формат memdump); возвращает
+    текст расхождения или None. Для эталонов sparse/diff и памяти с отслеживанием
+    записей сравниваются только записанные ячейки и ячейки эталона.
+    """
+    if not os.path.exists(golden_path):
+        return f"нет эталонного дампа {golden_path}"
+    with load_dump(golden_path) as golden:
+        if golden.end > len(memory):
+            return f"эталонный дамп выходит за размер памяти ({golden.end} > {len(memory)})"
+        mismatches = find_mismatches(memory, golden, limit=1)
+    if not mismatches:
+        return None
+    address, actual, expected = mismatches[0]
+    return f"M[{address}] = {actual}, ожидается {expected}"
+
+
+def write_artifacts(paths, binary_data, dump_path, dump_format="json", options=None):
+    """Сохраняет бинарный код, журнал трассировки и дамп памяти (повторным прогоном с --trace)."""
+    with open(paths["bin"], 'wb') as f:
+        f.write(binary_data)
+    interp = Interpreter(**(options or {}))
+    log = io.StringIO()
+    with contextlib.redirect_stderr(log), contextlib.redirect_stdout(log):
+        try:
+            interp.load_program_data(binary_data)
+            interp.run(trace=True)
+            interp.dump_memory(dump_path, fmt=dump_format)
+        except Exception as e:
+            print(f"\n--- ОШИБКА ИНТЕРПРЕТАЦИИ ---\n{e}")
+    with open(paths["log"], 'w') as f:
+        f.write(log.getvalue())
+
+
+def run_test(test_path, update_golden=False, golden_format="json"):
+    """
+    Ассемблирует тест один раз, исполняет его каждым движком из ENGINES
+    в текущем процессе и сравнивает память каждого движка с эталонным дампом,
+    а вывод (предупреждения, ошибки, число шагов) - с выводом движка classic.
+    Затем то же для программы, собранной с -O (см. check_optimized).
+    Артефакты (.bin, журнал, дамп) пишутся только при провале теста или при
+    обновлении эталонов (в формате golden_format; эталоны sparse загружаются
+    намного быстрее json). Возвращает (путь, успех, сообщение).
+    """
+    paths = artifact_paths(test_path)
+    options = read_test_options(test_path)
+    binary_data = b""
+    stage = "ассемблирования"
+    runs = {}
     try:
-        result_asm = subprocess.run([
-            sys.executable, assembler_path, '--input', test_csv_path, '--output', binary_file, '--test'
-        ], capture_output=True, text=True, check=True)
-        print(result_asm.stdout)
-    except subprocess.CalledProcessError as e:
-        print(f"Ошибка ассемблирования для {test_csv_path}: {e.stderr}")
-        return False
-
-    # 2. Интерпретация
-    print("2. Интерпретация...")
+        binary_data = load_test_program(test_path)
+        for engine in ENGINES:
+            stage = f"исполнения (движок {engine})"
+            runs[engine] = execute(binary_data, engine, **options)
+    except Exception:
+        message = f"ошибка {stage}:\n" + traceback.format_exc()
+        write_artifacts(paths, binary_data, paths["actual"], options=options)
+        return test_path, False, message
+
+    if update_golden:
+        write_artifacts(paths, binary_data, paths["golden"], golden_format, options)
+        return test_path, True, "эталон обновлён"
+
+    _, expected_output = runs["classic"]
+    for engine, (interp, output) in runs.items():
+        mismatch = compare_with_golden(interp.memory, paths["golden"]) or compare_output(output, expected_output)
+        if mismatch is not None:
+            write_artifacts(paths, binary_data, paths["actual"], options=options)
+            return test_path, False, f"движок {engine}: {mismatch}"
     try:
-        with open(output_log, 'w') as log_f:
-            result_interp = subprocess.run([
-                sys.executable, interpreter_path, '--input', binary_file, '--output', memory_dump, '--trace'
-            ], stdout=log_f, stderr=subprocess.STDOUT, check=True)
-        print(f"  Вывод интерпретатора сохранен в {output_log}")
-        print(f"  Дамп памяти сохранен в {memory_dump}")
-    except subprocess.CalledProcessError as e:
-        print(f"Ошибка интерпретации для {binary_file}")
-        # Пишем ошибку в лог, даже если интерпретация упала
-        with open(output_log, 'a') as log_f:
-            log_f.write(f"\n--- ОШИБКА ИНТЕРПРЕТАЦИИ ---\n{e}\n")
-        return False
-
-    print(f"3. Бинарный файл сохранен в {binary_file}")
-    print("")
-    return True
-
-def run_all_tests(assembler_path, interpreter_path, tests_dir="tests"):
-    """Находит и запускает все тесты в директории."""
-    if not os.path.isfile(assembler_path):
-        print(f"Ошибка: Ассемблер '{assembler_path}' не найден.")
-        return
-    if not os.path.isfile(interpreter_path):
-        print(f"Ошибка: Интерпретатор '{interpreter_path}' не найден.")
-        return
-
-    success_count = 0
-    total_count = 0
-
-    for filename in os.listdir(tests_dir):
-        if filename.startswith("test_example_") and filename.endswith(".csv"):
-            test_path = os.path.join(tests_dir, filename)
-            total_count += 1
-            if run_test(assembler_path, interpreter_path, test_path):
-                success_count += 1
+        mismatch = check_optimized(test_path, paths["golden"], expected_output, options)
+    except Exception:
+        mismatch = "-O: ошибка исполнения:\n" + traceback.format_exc()
+    if mismatch is not None:
+        write_artifacts(paths, binary_data, paths["actual"], options=options)
+        return test_path, False, mismatch
+    if os.path.exists(paths["actual"]):
+        os.remove(paths["actual"])  # Остался от предыдущего провала
+    return test_path, True, ""
+
+
+def discover_tests(tests_dir):
+    """
+    Находит тесты test_example_*: исходники .csv и бинарные программы .bin
+    без исходника (например, с ошибкой декодирования, невыразимой в CSV).
+    """
+    filenames = set(os.listdir(tests_dir))
+    tests = []
+    for filename in filenames:
+        base, extension = os.path.splitext(filename)
+        if filename.startswith("test_example_") and (
+                extension == ".csv" or (extension == ".bin" and f"{base}.csv" not in filenames)):
+            tests.append(os.path.join(tests_dir, filename))
+    return sorted(tests)
+
+
+def run_all_tests(tests_dir="tests", jobs=None, update_golden=False, golden_format="json"):
+    """Запускает все тесты в пуле процессов; возвращает число проваленных."""
+    tests = discover_tests(tests_dir)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(tests) > 1:
+        chunksize = max(1, len(tests) // (jobs * 4))
+        with ProcessPoolExecutor(jobs) as pool:
+            results = list(pool.map(run_test, tests, [update_golden] * len(tests),
+                                    [golden_format] * len(tests), chunksize=chunksize))
+    else:
+        results = [run_test(test, update_golden, golden_format) for test in tests]
+
+    failed = 0
+    for test_path, ok, message in results:
+        if not ok:
+            failed += 1
+            print(f"ПРОВАЛ {test_path}: {message}")
+            print(f"  Артефакты сохранены рядом с тестом ({artifact_paths(test_path)['actual']})")
+        elif message:
+            print(f"{test_path}: {message}")
 
     print(f"--- Сводка ---")
-    print(f"Всего тестов: {total_count}")
-    print(f"Успешно пройдено: {success_count}")
-    print(f"Провалено: {total_count - success_count}")
+    print(f"Всего тестов: {len(results)}")
+    print(f"Успешно пройдено: {len(results) - failed}")
+    print(f"Провалено: {failed}")
+    return failed
 
 
 if __name__ == "__main__":
-    # Пути к ассемблеру и интерпретатору (предполагаем, что они находятся в корне репозитория)
-    ASSEMBLER_PATH = "assembler.py"  # или путь к исполняемому файлу
-    INTERPRETER_PATH = "interpreter.py"  # или путь к исполняемому файлу
-
-    if len(sys.argv) == 3:
-        ASSEMBLER_PATH = sys.argv[1]
-        INTERPRETER_PATH = sys.argv[2]
+    parser = argparse.ArgumentParser(description='Регрессионные тесты УВМ: сравнение памяти всех движков с эталонными дампами')
+    parser.add_argument('--tests-dir', default='tests',
+                        help='Каталог с тестами test_example_*.csv (и бинарными test_example_*.bin без исходника)')
+    parser.add_argument('--jobs', type=int, help='Число процессов (по умолчанию - число процессоров)')
+    parser.add_argument('--update-golden', action='store_true',
+                        help='Перезаписать эталонные дампы, бинарный код и журналы')
+    parser.add_argument('--golden-format', choices=DUMP_FORMATS, default='json',
+                        help='Формат записываемых эталонов (sparse - для больших наборов тестов)')
+    args = parser.parse_args()
 
-    run_all_tests(ASSEMBLER_PATH, INTERPRETER_PATH)
\ No newline at end of file
+    sys.exit(1 if run_all_tests(args.tests_dir, args.jobs, args.update_golden, args.golden_format) else 0)
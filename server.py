@@ -0,0 +1,117 @@
+# server.py: Долгоживущий сервер УВМ (ассемблирование, исполнение, печать трассировки)
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import socketserver
+import sys
+import assembler
+import interpreter
+import trace_dump
+from client import DEFAULT_SOCKET
+
+# Команды сервера: имя -> точка входа CLI, принимающая argv
+COMMANDS = {
+    "assemble": assembler.main,
+    "run": interpreter.main,
+    "dump": trace_dump.main,
+}
+
+DECODE_CACHE_LIMIT = 256  # Предел числа программ в кэше предекодирования
+
+
+def execute_request(request):
+    """
+    Выполняет запрос {"command", "argv", "cwd"} в текущем процессе: вызывает
+    main() соответствующего модуля с тем же набором флагов, что и CLI,
+    перехватывая stdout, stderr и код завершения.
+    """
+    command = request.get("command")
+    if command == "ping":
+        return {"rc": 0, "stdout": "", "stderr": ""}
+    if command not in COMMANDS:
+        return {"rc": 2, "stdout": "", "stderr": f"Неизвестная команда сервера: {command}\n"}
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    previous_cwd = os.getcwd()
+    rc = 0
+    try:
+        os.chdir(request.get("cwd", previous_cwd))
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                COMMANDS[command](request.get("argv", []))
+            except SystemExit as e:
+                rc = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except Exception as e:
+                print(f"Ошибка: {e}", file=sys.stderr)
+                rc = 1
+    finally:
+        os.chdir(previous_cwd)
+
+    cache = interpreter.Interpreter.decode_cache
+    if len(cache) > DECODE_CACHE_LIMIT:
+        cache.clear()
+    return {"rc": rc, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Протокол: по одной JSON-строке запроса и ответа на каждый запрос соединения."""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                response = {"rc": 2, "stdout": "", "stderr": "Некорректный запрос\n"}
+            else:
+                if request.get("command") == "shutdown":
+                    self.wfile.write(b'{"rc": 0, "stdout": "", "stderr": ""}\n')
+                    self.server.stop = True
+                    return
+                response = execute_request(request)
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+
+
+class UVMServer(socketserver.UnixStreamServer):
+    """
+    Запросы обрабатываются последовательно в одном процессе: модули уже
+    импортированы, кэши предекодирования (не больше DECODE_CACHE_LIMIT
+    программ) и скомпилированных программ (engines._COMPILED_CACHE, не больше
+    engines.COMPILED_CACHE_LIMIT) сохраняются между запросами.
+    """
+
+    def __init__(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+        super().__init__(path, RequestHandler)
+        self.path = path
+        self.stop = False
+        interpreter.Interpreter.decode_cache = {}
+
+    def serve(self):
+        try:
+            while not self.stop:
+                self.handle_request()
+        finally:
+            self.server_close()
+            os.remove(self.path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Сервер УВМ: ассемблирование и исполнение без запуска нового процесса')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='Путь к Unix-сокету сервера')
+
+    args = parser.parse_args(argv)
+
+    server = UVMServer(args.socket)
+    print(f"Сервер УВМ слушает {args.socket}", file=sys.stderr)
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
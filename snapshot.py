@@ -0,0 +1,63 @@
+# snapshot.py: Снимки состояния УВМ (PC, регистры, память)
+
+import struct
+from array import array
+from memory import capture_image, create_memory, restore_image
+
+# Заголовок файла снимка: сигнатура, версия, тип памяти, PC, размер памяти,
+# число сохранённых (ненулевых) ячеек
+SNAPSHOT_HEADER = struct.Struct("<4sH2x8sQQQ")
+SNAPSHOT_MAGIC = b"UVMS"
+SNAPSHOT_VERSION = 1
+REGISTERS = struct.Struct("<8q")
+
+
+class VMSnapshot:
+    """
+    Состояние машины в момент снимка. Память - образ capture_image памяти
+    интерпретатора: страницы, не записанные между снимками, разделяются
+    с предыдущим образом (или, для страничной памяти, с интерпретатором
+    до первой записи).
+    """
+
+    def __init__(self, pc, registers, memory):
+        self.pc = pc
+        self.registers = tuple(registers)
+        self.memory = memory
+
+    def memory_copy(self, kind=None):
+        """Новая память с содержимым снимка; kind - тип памяти результата."""
+        memory = create_memory(kind or self.memory.name, len(self.memory))
+        if memory.name == self.memory.name:
+            return restore_image(memory, self.memory)
+        for address, value in self.memory.nonzero_items(0, len(self.memory)):
+            memory[address] = value
+        return memory
+
+    def save(self, path):
+        """Сохраняет снимок в файл: заголовок, регистры и ненулевые ячейки памяти."""
+        items = self.memory.nonzero_items(0, len(self.memory))
+        addresses = array("q", [address for address, _ in items])
+        values = array("q", [value for _, value in items])
+        with open(path, 'wb') as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, self.memory.name.encode(),
+                                         self.pc, len(self.memory), len(items)))
+            f.write(REGISTERS.pack(*self.registers))
+            addresses.tofile(f)
+            values.tofile(f)
+
+    @classmethod
+    def load(cls, path):
+        """Читает снимок из файла."""
+        with open(path, 'rb') as f:
+            magic, version, kind, pc, size, count = SNAPSHOT_HEADER.unpack(f.read(SNAPSHOT_HEADER.size))
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                raise ValueError(f"Файл {path} не является снимком УВМ версии {SNAPSHOT_VERSION}")
+            registers = REGISTERS.unpack(f.read(REGISTERS.size))
+            addresses, values = array("q"), array("q")
+            addresses.fromfile(f, count)
+            values.fromfile(f, count)
+        memory = create_memory(kind.rstrip(b"\0").decode(), size)
+        for address, value in zip(addresses, values):
+            memory[address] = value
+        return cls(pc, registers, capture_image(memory))
@@ -0,0 +1,33 @@
+# trace_dump.py: Вывод бинарной трассировки УВМ в текстовом формате журнала
+
+import argparse
+import sys
+from tracing import read_trace, render_record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Печать бинарной трассировки УВМ в формате журнала --trace')
+    parser.add_argument('--input', required=True, help='Файл трассировки (interpreter.py --trace-file)')
+    parser.add_argument('--output', help='Выходной текстовый файл (по умолчанию - stdout)')
+
+    args = parser.parse_args(argv)
+
+    try:
+        records = read_trace(args.input)
+        out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+        try:
+            for record in records:
+                print("\n".join(render_record(record)), file=out)
+        finally:
+            if args.output:
+                out.close()
+    except FileNotFoundError:
+        print(f"Ошибка: Файл {args.input} не найден.", file=sys.stderr)
+        sys.exit(1)
+    except ValueError as e:
+        print(f"Ошибка чтения трассировки: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# tracing.py: Трассировка исполнения УВМ в виде потока бинарных записей
+
+import struct
+import sys
+from uvmspec import UVMSpec24
+
+# Заголовок файла трассировки: сигнатура, версия, размер записи
+TRACE_HEADER = struct.Struct("<4sHH8x")
+TRACE_MAGIC = b"UVMT"
+TRACE_VERSION = 1
+
+# Запись одного шага (64 байта): шаг, PC, код операции, флаги,
+# исходные поля B-E, эффективный адрес, значение, операнд и величина сдвига
+RECORD = struct.Struct("<QIBB2xIIIIqqqq")
+
+# Флаги записи
+TRACE_FAULT = 1  # Выход за границы памяти
+TRACE_NEGATIVE_SHIFT = 2  # Отрицательный сдвиг
+TRACE_DECODE_ERROR = 4  # Ошибка декодирования (в поле B - число доступных байт)
+TRACE_END = 8  # Конец программы
+TRACE_ABORTED = 16  # Команда прервана исключением
+
+_FAULT_NAMES = {
+    UVMSpec24.OP_READ: "READ",
+    UVMSpec24.OP_WRITE: "WRITE",
+    UVMSpec24.OP_SHIFT_RIGHT: "SHIFT_RIGHT",
+}
+
+
+def decode_error_message(pc, opcode, available):
+    """Восстанавливает текст ошибки декодирования команды на PC."""
+    if opcode not in UVMSpec24.CMD_SIZES:
+        reason = f"Неизвестный код операции: {opcode}"
+    else:
+        size = UVMSpec24.CMD_SIZES[opcode]
+        reason = (f"Недостаточно байт для декодирования команды {opcode} начиная с {pc}. "
+                  f"Ожидается {size}, доступно {available}.")
+    return f"Ошибка декодирования команды на PC={pc}: {reason}"
+
+
+def event_messages(opcode, flags, address, amount):
+    """Предупреждения и ошибки шага - выводятся и без трассировки."""
+    lines = []
+    if flags & TRACE_NEGATIVE_SHIFT:
+        lines.append(f"  ПРЕДУПРЕЖДЕНИЕ: Отрицательный сдвиг {amount}, устанавливаем 0")
+    if flags & TRACE_FAULT:
+        lines.append(f"  ОШИБКА: Выход за границы памяти при {_FAULT_NAMES[opcode]} по адресу {address}")
+    return lines
+
+
+def render_record(record):
+    """Строки текстового журнала (формат --trace) для одной записи."""
+    step, pc, opcode, flags, b, c, d, e, address, value, operand, amount = record
+    lines = [f"--- Шаг {step} ---"]
+    if flags & TRACE_END:
+        return lines
+    if flags & TRACE_DECODE_ERROR:
+        lines.append(decode_error_message(pc, opcode, b))
+        return lines
+
+    raw = {"B": b, "C": c, "D": d, "E": e}
+    fields = {name: opcode if name == "A" else raw[name] for name, _, _ in UVMSpec24.FIELDS[opcode]}
+    lines.append(f"PC={pc}, Команда: {fields}, Размер: {UVMSpec24.CMD_SIZES[opcode]}")
+    if flags & TRACE_ABORTED:
+        return lines
+    lines.extend(event_messages(opcode, flags, address, amount))
+    if flags & TRACE_FAULT:
+        return lines
+
+    if opcode == UVMSpec24.OP_LOAD:
+        lines.append(f"  LOAD_CONST R{b} <- {value} (R={value})")
+    elif opcode == UVMSpec24.OP_READ:
+        lines.append(f"  READ_MEM M[R{d}+{UVMSpec24.sign_extend(b)}] -> R{c} (M[{address}]={value})")
+    elif opcode == UVMSpec24.OP_WRITE:
+        lines.append(f"  WRITE_MEM R{b}(={value}) -> M[R{c}](={address})")
+    elif opcode == UVMSpec24.OP_SHIFT_RIGHT:
+        lines.append(f"  SHIFT_RIGHT R{b}(={operand}) >> {amount} -> M[R{e}](={address}), Val={value}")
+    return lines
+
+
+class TextTracer:
+    """Печатает журнал шагов в текстовом виде (режим --trace)."""
+    echoes_messages = True  # Предупреждения и ошибки выводятся в составе журнала
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stderr
+
+    def record(self, *fields):
+        print("\n".join(render_record(fields)), file=self.stream)
+
+    def close(self):
+        pass
+
+
+class TraceFile:
+    """Буферизованная запись бинарных записей трассировки в файл."""
+    echoes_messages = False
+
+    def __init__(self, path, buffer_records=4096):
+        self.file = open(path, 'wb')
+        self.file.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, RECORD.size))
+        self.buffer = bytearray(RECORD.size * buffer_records)
+        self.offset = 0
+
+    def record(self, *fields):
+        RECORD.pack_into(self.buffer, self.offset, *fields)
+        self.offset += RECORD.size
+        if self.offset == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        self.file.write(memoryview(self.buffer)[:self.offset])
+        self.offset = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+class TraceRing:
+    """Кольцевой буфер последних capacity записей трассировки в памяти."""
+    echoes_messages = False
+
+    def __init__(self, capacity):
+        if capacity <= 0:
+            raise ValueError("Размер кольцевого буфера трассировки должен быть положительным")
+        self.capacity = capacity
+        self.buffer = bytearray(RECORD.size * capacity)
+        self.count = 0  # Всего записей (включая вытесненные)
+
+    def record(self, *fields):
+        RECORD.pack_into(self.buffer, (self.count % self.capacity) * RECORD.size, *fields)
+        self.count += 1
+
+    def records(self):
+        """Сохранённые записи от старых к новым."""
+        first = max(0, self.count - self.capacity)
+        for i in range(first, self.count):
+            yield RECORD.unpack_from(self.buffer, (i % self.capacity) * RECORD.size)
+
+    def save(self, path):
+        """Сохраняет содержимое буфера в файл трассировки."""
+        with open(path, 'wb') as f:
+            f.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, RECORD.size))
+            for fields in self.records():
+                f.write(RECORD.pack(*fields))
+
+    def close(self):
+        pass
+
+
+class TracerGroup:
+    """Передаёт каждую запись нескольким приёмникам (например, журналу и профилировщику)."""
+
+    def __init__(self, *tracers):
+        self.tracers = tracers
+        self.echoes_messages = any(tracer.echoes_messages for tracer in tracers)
+
+    def record(self, *fields):
+        for tracer in self.tracers:
+            tracer.record(*fields)
+
+    def close(self):
+        for tracer in self.tracers:
+            tracer.close()
+
+
+def read_trace(path):
+    """Читает записи из файла трассировки."""
+    with open(path, 'rb') as f:
+        magic, version, record_size = TRACE_HEADER.unpack(f.read(TRACE_HEADER.size))
+        if magic != TRACE_MAGIC or version != TRACE_VERSION or record_size != RECORD.size:
+            raise ValueError(f"Файл {path} не является трассировкой УВМ версии {TRACE_VERSION}")
+        data = f.read()
+    return RECORD.iter_unpack(data[:len(data) - len(data) % RECORD.size])
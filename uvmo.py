@@ -0,0 +1,212 @@
+# uvmo.py: Объектный формат УВМ с индексом команд (загрузка через mmap без копирования)
+
+import bisect
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from memory import to_little_endian
+from uvmspec import UVMSpec24
+
+# Заголовок (72 байта, little-endian): сигнатура, версия, флаги, версия спецификации,
+# CRC32 всего содержимого после заголовка (индекс, операнды, код), число команд,
+# размер кода, смещения секций индекса, операндов и кода
+OBJECT_HEADER = struct.Struct("<4sHH16sIxxxxQQQQQ")
+OBJECT_MAGIC = b"UVMO"
+OBJECT_VERSION = 2
+FLAG_OPERANDS = 1  # Есть секция предекодированных операндов
+
+# Поля операндов в секции: исходные (беззнаковые) значения B, C, D, E по 32 бита
+OPERAND_FIELDS = "BCDE"
+ALIGNMENT = 8
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _fields(code, offset, opcode):
+    """Исходные поля команды по таблице FIELDS (как Interpreter.decode_command)."""
+    size = UVMSpec24.CMD_SIZES[opcode]
+    bits = int.from_bytes(code[offset:offset + size], 'little')
+    fields = {"A": opcode}
+    for name, start_bit, end_bit in UVMSpec24.FIELDS[opcode][1:]:
+        fields[name] = (bits >> start_bit) & ((1 << (end_bit - start_bit + 1)) - 1)
+    return fields
+
+
+def write_object(path, code, operands=True):
+    """
+    Записывает объектный файл для бинарного кода code. Код должен
+    декодироваться целиком (как результат работы ассемблера).
+    """
+    offsets = array("Q")
+    fields = array("I")
+    offset, total = 0, len(code)
+    while offset < total:
+        opcode = code[offset]
+        size = UVMSpec24.CMD_SIZES.get(opcode)
+        if size is None or offset + size > total:
+            raise ValueError(f"Некорректная команда на смещении {offset}: объектный файл не создан")
+        offsets.append(offset)
+        if operands:
+            decoded = _fields(code, offset, opcode)
+            fields.extend(decoded.get(name, 0) for name in OPERAND_FIELDS)
+        offset += size
+
+    index_offset = OBJECT_HEADER.size
+    operands_offset = _align(index_offset + 8 * len(offsets)) if operands else 0
+    code_offset = _align((operands_offset + 4 * len(fields)) if operands else index_offset + 8 * len(offsets))
+
+    # Содержимое после заголовка по порядку, с выравнивающими нулями
+    body, position = [], index_offset
+    for offset, section in ((index_offset, to_little_endian(offsets)),
+                            (operands_offset, to_little_endian(fields) if operands else None),
+                            (code_offset, code)):
+        if section is None:
+            continue
+        body.extend((b"\0" * (offset - position), section))
+        position = offset + memoryview(section).nbytes
+    checksum = 0
+    for part in body:
+        checksum = zlib.crc32(part, checksum)
+
+    header = OBJECT_HEADER.pack(OBJECT_MAGIC, OBJECT_VERSION, FLAG_OPERANDS if operands else 0,
+                                UVMSpec24.VERSION.encode(), checksum, len(offsets), total,
+                                index_offset, operands_offset, code_offset)
+    with open(path, 'wb') as f:
+        f.write(header)
+        for part in body:
+            f.write(part)
+    return len(offsets)
+
+
+def is_object_file(path):
+    """Проверяет сигнатуру объектного файла."""
+    with open(path, 'rb') as f:
+        return f.read(len(OBJECT_MAGIC)) == OBJECT_MAGIC
+
+
+class ObjectFile:
+    """
+    Объектный файл, отображённый в память. Код, индекс и операнды доступны
+    как memoryview поверх mmap: открытие не читает и не копирует секции,
+    поэтому занимает постоянное время независимо от размера программы
+    (декодирование команд - см. Interpreter.load_object).
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mapping) < OBJECT_HEADER.size:
+            raise ValueError(f"Файл {path} не является объектным файлом УВМ")
+        (magic, version, flags, spec_version, self.checksum, self.count, code_size,
+         index_offset, operands_offset, code_offset) = OBJECT_HEADER.unpack_from(self.mapping)
+        if magic != OBJECT_MAGIC or version != OBJECT_VERSION:
+            raise ValueError(f"Файл {path} не является объектным файлом УВМ версии {OBJECT_VERSION}")
+        self.spec_version = spec_version.decode()
+        if self.spec_version != UVMSpec24.VERSION:
+            raise ValueError(f"Объектный файл {path} собран для другой версии спецификации "
+                             f"({self.spec_version}, ожидается {UVMSpec24.VERSION})")
+        if sys.byteorder != "little":
+            raise ValueError("Загрузка объектных файлов поддерживается только на little-endian платформах")
+
+        # Секции должны лежать внутри файла, после заголовка
+        sections = [(index_offset, 8 * self.count), (code_offset, code_size)]
+        if flags & FLAG_OPERANDS:
+            sections.append((operands_offset, 16 * self.count))
+        for offset, size in sections:
+            if offset < OBJECT_HEADER.size or offset + size > len(self.mapping):
+                raise ValueError(f"Объектный файл {path} повреждён: секция [{offset}, {offset + size}) "
+                                 f"вне файла размером {len(self.mapping)} байт")
+
+        view = memoryview(self.mapping)
+        self.code = view[code_offset:code_offset + code_size]
+        self.offsets = view[index_offset:index_offset + 8 * self.count].cast("Q")
+        self.operands = None
+        if flags & FLAG_OPERANDS:
+            self.operands = view[operands_offset:operands_offset + 16 * self.count].cast("I")
+
+    def verify(self):
+        """Сверяет CRC32 содержимого после заголовка - индекса, операндов и кода (читает весь файл)."""
+        if zlib.crc32(memoryview(self.mapping)[OBJECT_HEADER.size:]) != self.checksum:
+            raise ValueError("Контрольная сумма объектного файла не совпадает")
+
+    def instruction(self, index):
+        """N-я команда без декодирования предыдущих: (смещение, размер, исходные поля)."""
+        offset = self.offsets[index]
+        opcode = self.code[offset] if offset < len(self.code) else None
+        size = UVMSpec24.CMD_SIZES.get(opcode)
+        if size is None or offset + size > len(self.code):
+            raise ValueError(f"Объектный файл повреждён: некорректная команда {index} по смещению {offset}")
+        if self.operands is None:
+            fields = _fields(self.code, offset, opcode)
+        else:
+            raw = self.operands[4 * index:4 * index + 4]
+            fields = {"A": opcode}
+            for name, _, _ in UVMSpec24.FIELDS[opcode][1:]:
+                fields[name] = raw[OPERAND_FIELDS.index(name)]
+        return offset, size, fields
+
+    def index_of(self, offset):
+        """Номер команды, начинающейся по смещению offset, или None."""
+        index = bisect.bisect_left(self.offsets, offset)
+        if index < self.count and self.offsets[index] == offset:
+            return index
+        return None
+
+
+class CommandTable:
+    """
+    Ленивая таблица команд объектного файла (вместо Interpreter.decoded):
+    команда декодируется при первом обращении фабрикой make(pc, index, size, fields).
+    """
+
+    def __init__(self, obj, make):
+        self.obj = obj
+        self.make = make
+        self.cache = {}
+
+    def __len__(self):
+        return self.obj.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.obj.count))]
+        if index < 0:
+            index += self.obj.count
+        cmd = self.cache.get(index)
+        if cmd is None:
+            if not 0 <= index < self.obj.count:
+                raise IndexError("индекс команды вне диапазона")
+            offset, size, fields = self.obj.instruction(index)
+            cmd = self.cache[index] = self.make(offset, index, size, fields)
+        return cmd
+
+    def __iter__(self):
+        return (self[i] for i in range(self.obj.count))
+
+
+class PcTable:
+    """
+    Ленивое отображение PC -> команда (вместо Interpreter.pc_table) по индексу
+    смещений. При последовательном исполнении следующая команда находится
+    без поиска, иначе - двоичным поиском.
+    """
+
+    def __init__(self, commands):
+        self.commands = commands
+        self.offsets = commands.obj.offsets
+        self.count = commands.obj.count
+        self.next_index = 0
+
+    def get(self, pc):
+        """Команда, начинающаяся по адресу pc, или None (как dict.get)."""
+        index = self.next_index
+        if index >= self.count or self.offsets[index] != pc:
+            index = self.commands.obj.index_of(pc)
+            if index is None:
+                return None
+        self.next_index = index + 1
+        return self.commands[index]
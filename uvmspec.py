@@ -1,3 +1,6 @@
+import hashlib
+
+
 class UVMSpec24:
     OP_LOAD = 234  # Загрузка константы
     OP_READ = 102  # Чтение из памяти
@@ -76,51 +79,89 @@ class UVMSpec24:
         ]
     }
 
+    # Знаковые поля (дополнительный код своей ширины по FIELDS):
+    # так их интерпретирует интерпретатор
+    SIGNED_FIELDS = {
+        OP_LOAD: ("C",),
+        OP_READ: ("B",),
+        OP_SHIFT_RIGHT: ("D",),
+    }
+
+    @staticmethod
+    def sign_extend(value, width=13):
+        """Знаковая интерпретация поля шириной width бит."""
+        if value & (1 << (width - 1)):  # Установлен старший (знаковый) бит
+            return value - (1 << width)
+        return value
+
     def encode_command(self, cmd):
         """
         Кодирование команды в бинарный формат.
         Ожидает словарь с числовыми полями, например, {"A": 234, "B": 2, "C": 455}.
         """
-        opcode = cmd["A"]
-
-        # Проверяем тестовые команды
-        # Эта проверка нужна для режима --test в assembler.py
-        for test_name, test_data in self.TEST_COMMANDS.items():
-            if cmd == test_data["fields"]:  # Сравниваем по числовым полям
-                return bytes(test_data["hex"])
-
-        # Общее кодирование для остальных команд
-        if opcode == self.OP_LOAD:
-            # 3 байта: A (8), B (3), C (13)
-            b1 = opcode & 0xFF
-            b2 = ((cmd["C"] & 0x1F) << 3) | (cmd["B"] & 0x07)
-            b3 = (cmd["C"] >> 5) & 0xFF
-            return bytes([b1, b2, b3])
-
-        elif opcode == self.OP_READ:
-            # 4 байта: A (8), B (13), C (3), D (3)
-            b1 = opcode & 0xFF
-            b2 = cmd["B"] & 0xFF
-            b3 = ((cmd["C"] & 0x07) << 5) | ((cmd["B"] >> 8) & 0x1F)
-            b4 = (cmd["D"] & 0x07) << 5
-            return bytes([b1, b2, b3, b4])
-
-        elif opcode == self.OP_WRITE:
-            # 2 байта: A (8), B (3), C (3)
-            b1 = opcode & 0xFF
-            b2 = ((cmd["C"] & 0x07) << 3) | (cmd["B"] & 0x07)
-            return bytes([b1, b2])
-
-
-        elif opcode == self.OP_SHIFT_RIGHT:
-            # 7 байт: A (8), B (3), C (23), D (13), E (3)
-            b1 = opcode & 0xFF
-            b2 = ((cmd["C"] & 0x1F) << 3) | (cmd["B"] & 0x07)
-            b3 = (cmd["C"] >> 5) & 0xFF
-            b4 = (cmd["C"] >> 13) & 0xFF
-            b5 = ((cmd["C"] >> 21) & 0x03) | ((cmd["D"] & 0x3F) << 2)
-            b6 = (cmd["D"] >> 6) & 0x7F
-            b7 = ((cmd["E"] & 0x07) << 5) | ((cmd["D"] >> 13) & 0x1F)
-            return bytes([b1, b2, b3, b4, b5, b6, b7])
-
-        raise ValueError(f"Неизвестный код операции: {opcode}")
+        encoder = self.ENCODERS.get(cmd["A"])
+        if encoder is None:
+            raise ValueError(f"Неизвестный код операции: {cmd['A']}")
+        return encoder(cmd)
+
+    def encode_many(self, commands):
+        """
+        Кодирует последовательность команд в bytearray. Размер результата
+        считается заранее по CMD_SIZES, буфер выделяется один раз, и каждая
+        команда записывается упаковщиком из PACKERS прямо в свой срез.
+        """
+        commands = commands if isinstance(commands, list) else list(commands)
+        sizes, packers = self.CMD_SIZES, self.PACKERS
+        try:
+            buf = bytearray(sum([sizes[cmd["A"]] for cmd in commands]))
+        except KeyError as e:
+            raise ValueError(f"Неизвестный код операции: {e.args[0]}") from None
+        offset = 0
+        for cmd in commands:
+            opcode = cmd["A"]
+            size = sizes[opcode]
+            buf[offset:offset + size] = packers[opcode](cmd).to_bytes(size, 'little')
+            offset += size
+        return buf
+
+    @classmethod
+    def field_mask(cls, opcode):
+        """Маска битов команды, занятых полями из FIELDS."""
+        mask = 0
+        for _, start_bit, end_bit in cls.FIELDS[opcode]:
+            mask |= ((1 << (end_bit - start_bit + 1)) - 1) << start_bit
+        return mask
+
+
+def _generate_coders(opcode, size, fields):
+    """
+    Генерирует по таблице FIELDS пару функций для кода операции:
+    pack(cmd) -> int (значение команды) и encode(cmd) -> bytes.
+    Поле A подставляется как константа, остальные маскируются по ширине.
+    """
+    parts = [str(opcode)]
+    for name, start_bit, end_bit in fields:
+        if name == "A":
+            continue
+        mask = (1 << (end_bit - start_bit + 1)) - 1
+        parts.append(f"(cmd[{name!r}] & {mask:#x}) << {start_bit}")
+    value = " | ".join(parts)
+    source = (
+        f"def pack(cmd):\n"
+        f"    return {value}\n"
+        f"def encode(cmd):\n"
+        f"    return ({value}).to_bytes({size}, 'little')\n"
+    )
+    namespace = {}
+    exec(compile(source, f"<uvm encoder {opcode}>", "exec"), namespace)
+    return namespace["pack"], namespace["encode"]
+
+
+# Упаковщики и кодировщики строятся один раз при импорте
+_CODERS = {opcode: _generate_coders(opcode, UVMSpec24.CMD_SIZES[opcode], fields)
+           for opcode, fields in UVMSpec24.FIELDS.items()}
+UVMSpec24.PACKERS = {opcode: coders[0] for opcode, coders in _CODERS.items()}
+UVMSpec24.ENCODERS = {opcode: coders[1] for opcode, coders in _CODERS.items()}
+
+# Версия спецификации: меняется при любом изменении форматов команд
+UVMSpec24.VERSION = hashlib.sha256(repr((UVMSpec24.CMD_SIZES, UVMSpec24.FIELDS)).encode()).hexdigest()[:16]